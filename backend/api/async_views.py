@@ -0,0 +1,176 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.request import Request
+
+from .cache import catalog_version_key, version_timestamp
+from foodgram.executors import get_executor
+
+# Маршруты роутера, которые под ASGI получают async-обработчик.
+CATALOG_ROUTES = (
+    "tags-list", "tags-detail", "ingredients-list", "ingredients-detail",
+)
+OFFLOADED_ROUTES = (
+    "recipes-list", "recipes-detail", "recipes-download-shopping-cart",
+)
+
+
+async def iterate(chunks):
+    """
+    Потоковое содержимое по одной части за раз. next() выполняется
+    в потоке текущего запроса, поэтому курсор базы, открытый при
+    первом чтении, не переходит между потоками; соединение закрывает
+    request_finished в том же потоке.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def run_view(view, request, *args, **kwargs):
+    """
+    View целиком в потоке пула, ответ рендерится там же. Соединения
+    закрываются так же, как после обычного запроса; потоковое
+    содержимое читается позже, см. iterate.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def offloaded(view):
+    """Async-обработчик, который выполняет синхронный view в пуле."""
+
+    async def async_view(request, *args, **kwargs):
+        # Сколько синхронных view выполняется одновременно в воркере,
+        # ограничено ASYNC_VIEW_WORKERS; медленный рендеринг pdf или
+        # разбор картинки не занимает поток обработки запросов.
+        executor = get_executor("api-views", settings.ASYNC_VIEW_WORKERS)
+        response = await sync_to_async(
+            run_view, thread_sensitive=False, executor=executor,
+        )(view, request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            response.streaming_content = iterate(
+                iter(response.streaming_content))
+        return response
+
+    async_view.csrf_exempt = True
+    return async_view
+
+
+async def has_valid_token(request):
+    """
+    Проверка токена как в TokenAuthentication, через async ORM:
+    с неверным токеном ответ должен остаться 401.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b"token":
+        return True
+    try:
+        key = auth[1].decode() if len(auth) == 2 else None
+    except UnicodeError:
+        return False
+    return key is not None and await Token.objects.filter(
+        key=key, user__is_active=True).aexists()
+
+
+async def json_renderer(request, negotiator, renderers, file_format):
+    """
+    Renderer и media type для ответа из кеша: только JSON и только
+    без неверного токена, остальное решает синхронный view.
+    """
+    try:
+        renderer, media_type = negotiator.select_renderer(
+            Request(request), renderers, file_format)
+    except NotAcceptable:
+        return None
+    if renderer.format != "json" or not await has_valid_token(request):
+        return None
+    return renderer, media_type
+
+
+def cached_catalog(view):
+    """
+    Async-обработчик справочника: ответ из кеша CachedCatalogMixin,
+    включая 304, без потоков и запросов к базе. Промах кеша, другие
+    форматы и методы - синхронный view в пуле, он же заполняет кеш.
+    """
+    viewset = view.cls
+    model = viewset.queryset.model
+    renderers = [renderer() for renderer in viewset.renderer_classes]
+    negotiator = viewset.content_negotiation_class()
+    methods = {*view.actions, "head", "options"}
+    allow = ", ".join(
+        method.upper() for method in viewset.http_method_names
+        if method in methods
+    )
+    fallback = offloaded(view)
+
+    async def cached_response(request, file_format):
+        accepted = await json_renderer(
+            request, negotiator, renderers, file_format)
+        if accepted is None:
+            return None
+        renderer, media_type = accepted
+        version = await cache.aget(catalog_version_key(model))
+        if version is None:
+            return None
+        path = request.get_full_path()
+        etag = viewset.catalog_etag(version, renderer.format, path)
+        last_modified = version_timestamp(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            data = await cache.aget(viewset.catalog_cache_key(version, path))
+            if data is None:
+                return None
+            response = HttpResponse(
+                renderer.render(data, media_type),
+                content_type=renderer.media_type,
+            )
+        response["Allow"] = allow
+        patch_vary_headers(response, ("Accept",))
+        return viewset.patch_catalog_headers(response, etag, last_modified)
+
+    async def async_view(request, *args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            response = await cached_response(request, kwargs.get("format"))
+            if response is not None:
+                return response
+        return await fallback(request, *args, **kwargs)
+
+    async_view.csrf_exempt = True
+    return async_view
+
+
+def async_urls(urlpatterns):
+    """
+    Маршруты роутера с async-обработчиками для ASGI: справочники
+    из кеша, список рецептов и выгрузка списка покупок - в пуле.
+    """
+    handlers = dict.fromkeys(CATALOG_ROUTES, cached_catalog)
+    handlers.update(dict.fromkeys(OFFLOADED_ROUTES, offloaded))
+    return [
+        URLPattern(
+            pattern.pattern,
+            handlers[pattern.name](pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        ) if pattern.name in handlers else pattern
+        for pattern in urlpatterns
+    ]
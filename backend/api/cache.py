@@ -0,0 +1,60 @@
+import time
+
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+SHOPPING_LIST_VERSION_KEY = "shopping_list_version"
+
+
+def get_versions(*keys):
+    """
+    Текущие версии закешированных данных.
+    Версия - время создания и случайная строка, поэтому вытеснение
+    ключа версии из кеша не возвращает к старой версии.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_version(key):
+    return get_versions(key)[0]
+
+
+def new_version():
+    return f"{int(time.time())}.{uuid4().hex}"
+
+
+def version_timestamp(version):
+    """Время создания версии."""
+    return int(version.split(".")[0])
+
+
+def bump_version(key):
+    """
+    Сдвиг версии: все записи со старой версией устаревают.
+    Внутри транзакции - после её фиксации: иначе конкурентный запрос
+    прочитает ещё старые строки и закеширует их под новой версией.
+    """
+    transaction.on_commit(lambda: cache.set(key, new_version(), None))
+
+
+def shopping_list_version_key(user_id):
+    return f"{SHOPPING_LIST_VERSION_KEY}:{user_id}"
+
+
+def recipe_version_key(recipe_id):
+    return f"recipe_version:{recipe_id}"
+
+
+def user_version_key(user_id):
+    return f"user_version:{user_id}"
+
+
+def catalog_version_key(model):
+    return f"catalog_version:{model._meta.label_lower}"
@@ -1,36 +1,121 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, F, Value, When
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
-from foodgram.models import Recipe
+from .cache import catalog_version_key, get_version
+from foodgram.models import Recipe, Tag
+from foodgram.search import search_recipes
 
 User = get_user_model()
 
+ORDERING_CHOICES = (
+    ("popular", "Популярные"),
+    ("trending", "Популярные сейчас"),
+)
+TAGS_MATCH_ANY = "any"
+TAGS_MATCH_ALL = "all"
+TAGS_MATCH_CHOICES = (
+    (TAGS_MATCH_ANY, "Любой из тегов"),
+    (TAGS_MATCH_ALL, "Все теги"),
+)
+
+
+def get_tag_ids():
+    """Словарь slug -> id тегов, кешируется до изменения тегов."""
+    cache_key = f"tag_ids:{get_version(catalog_version_key(Tag))}"
+    tag_ids = cache.get(cache_key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list("slug", "id"))
+        cache.set(cache_key, tag_ids, None)
+    return tag_ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+class IngredientsFilter(BaseFilterBackend):
+    """
+    Поиск ингредиентов для автодополнения (?name=).
+    Сначала идут совпадения по началу названия, затем по вхождению.
+    """
 
-class IngredientsFilter(SearchFilter):
-    "Фильтр для серелизатора Ingredients."
     search_param = "name"
 
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, "").strip()
+        if not name:
+            return queryset
+        return queryset.filter(name__icontains=name).annotate(
+            is_substring=Case(
+                When(name__istartswith=name, then=Value(False)),
+                default=Value(True),
+                output_field=BooleanField(),
+            )
+        ).order_by("is_substring", "name")
+
 
 class AuthorAndTagFilter(FilterSet):
     "Фильтр для авторов и тегов."
 
-    tags = filters.AllValuesMultipleFilter(field_name="tags__slug")
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method="filter_tags")
+    tags_match = filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES, method="filter_tags_match")
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart")
+    search = filters.CharFilter(method="filter_search")
+    ordering = filters.ChoiceFilter(
+        choices=ORDERING_CHOICES, method="filter_ordering")
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты с любым (или со всеми, ?tags_match=all) из тегов.
+        Подзапрос по таблице связей не размножает строки рецептов.
+        """
+        tag_ids = get_tag_ids()
+        recipe_tags = Recipe.tags.through.objects.filter(
+            tag_id__in={tag_ids[slug] for slug in value})
+        if self.form.cleaned_data.get("tags_match") == TAGS_MATCH_ALL:
+            recipe_tags = recipe_tags.values("recipe_id").annotate(
+                tags_count=Count("tag_id")
+            ).filter(tags_count=len(set(value)))
+        return queryset.filter(id__in=recipe_tags.values("recipe_id"))
+
+    def filter_tags_match(self, queryset, name, value):
+        """Режим учитывается в filter_tags."""
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
-            return queryset.filter(cart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию, описанию и ингредиентам,
+        самые релевантные сверху (кроме курсорной пагинации).
+        """
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """
+        Сортировка по рейтингу из RecipeRating (refresh_rankings),
+        рецепты без рейтинга - в конце. Курсорная пагинация
+        по-прежнему идёт по -id.
+        """
+        return queryset.order_by(
+            F(f"rating__{value}_score").desc(nulls_last=True), "-id")
+
     class Meta:
         model = Recipe
         fields = ("tags", "author")
@@ -0,0 +1,121 @@
+import math
+import re
+import threading
+import time
+
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+from functools import wraps
+
+# Списки параметров IN (%s, %s, ...) разной длины - один и тот же запрос.
+PLACEHOLDERS = re.compile(r"\(%s(?:, %s)*\)")
+
+
+class QueryRecorder:
+    """execute_wrapper: количество и время запросов, повторы по форме."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[PLACEHOLDERS.sub("(%s, ...)", sql)] += 1
+
+    def repeated(self, threshold):
+        """Формы запросов, выполненные не меньше threshold раз: N+1."""
+        return [
+            (sql, count) for sql, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+class SerializationTimer:
+    """
+    Время в свойствах data сериализаторов за один запрос. Вложенные
+    вызовы, например data внутри SerializerMethodField, не суммируются.
+    """
+
+    current = ContextVar("serialization_timer", default=None)
+
+    def __init__(self):
+        self.duration = 0.0
+        self.depth = 0
+
+    @classmethod
+    def wrap(cls, data):
+        """Свойство data, засекающее своё время, если идёт замер."""
+        if getattr(data.fget, "serialization_timed", False):
+            return data
+
+        @wraps(data.fget)
+        def timed(serializer):
+            timer = cls.current.get()
+            if timer is None or timer.depth:
+                return data.fget(serializer)
+            timer.depth += 1
+            start = time.perf_counter()
+            try:
+                return data.fget(serializer)
+            finally:
+                timer.depth -= 1
+                timer.duration += time.perf_counter() - start
+
+        timed.serialization_timed = True
+        return property(timed)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+class MetricsRegistry:
+    """Последние замеры по каждому маршруту в памяти процесса."""
+
+    fields = ("total", "db", "serialize", "render", "queries", "size")
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=size))
+        self.repeats = Counter()
+
+    def add(self, route, repeated, **sample):
+        with self.lock:
+            self.samples[route].append(sample)
+            if repeated:
+                self.repeats[route] += 1
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.repeats.clear()
+
+    def report(self):
+        """p50/p95 каждой величины по маршрутам, самые медленные сверху."""
+        with self.lock:
+            samples = {route: list(rows) for route, rows in
+                       self.samples.items()}
+            repeats = dict(self.repeats)
+        report = []
+        for route, rows in samples.items():
+            item = {
+                "route": route,
+                "requests": len(rows),
+                "n_plus_one": repeats.get(route, 0),
+            }
+            for field in self.fields:
+                values = [row[field] for row in rows]
+                item[field] = {
+                    "p50": percentile(values, 0.5),
+                    "p95": percentile(values, 0.95),
+                }
+            report.append(item)
+        return sorted(
+            report, key=lambda item: item["total"]["p95"], reverse=True)
@@ -0,0 +1,101 @@
+import logging
+import time
+
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+from .metrics import MetricsRegistry, QueryRecorder, SerializationTimer
+from .serializers import RecipeCardSerializer
+
+logger = logging.getLogger(__name__)
+
+registry = MetricsRegistry(settings.API_METRICS_SAMPLES)
+
+# Сериализаторы, чьё свойство data считается временем сериализации.
+TIMED_SERIALIZERS = (
+    serializers.BaseSerializer,
+    serializers.Serializer,
+    serializers.ListSerializer,
+    RecipeCardSerializer,
+)
+
+
+class QueryMetricsMiddleware:
+    """
+    Замеры запросов к API: количество и время SQL, время сериализации
+    в view и рендеринга ответа после него, размер. Отдаются заголовком
+    Server-Timing и копятся в registry для отчёта GET /api/metrics/.
+    Включается настройкой API_METRICS.
+    """
+
+    def __init__(self, get_response):
+        if not settings.API_METRICS:
+            raise MiddlewareNotUsed
+        for serializer in TIMED_SERIALIZERS:
+            serializer.data = SerializationTimer.wrap(serializer.data)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith("/api/"):
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        timer = SerializationTimer()
+        request.metrics_render = 0.0
+        start = time.perf_counter()
+        token = SerializationTimer.current.set(timer)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            SerializationTimer.current.reset(token)
+        total = time.perf_counter() - start
+        self.record(request, response, recorder, timer.duration, total)
+        return response
+
+    def process_template_response(self, request, response):
+        """Ответы DRF рендерятся после view: засекаем это время."""
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.metrics_render = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, response, recorder, serialize, total):
+        match = request.resolver_match
+        route = f"{request.method} {match.view_name if match else '-'}"
+        size = (
+            int(response.get("Content-Length", 0)) if response.streaming
+            else len(response.content)
+        )
+        repeated = recorder.repeated(settings.API_METRICS_REPEAT_THRESHOLD)
+        for sql, count in repeated:
+            logger.warning("N+1 в %s: %s раз %s", route, count, sql)
+        render = request.metrics_render
+        response["Server-Timing"] = ", ".join((
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries"',
+            f"view;dur={(total - serialize - render) * 1000:.1f}",
+            f"serialize;dur={serialize * 1000:.1f}",
+            f"render;dur={render * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ))
+        if repeated:
+            response["X-Query-Repeats"] = max(count for _, count in repeated)
+        registry.add(
+            route,
+            bool(repeated),
+            total=round(total * 1000, 1),
+            db=round(recorder.duration * 1000, 1),
+            serialize=round(serialize * 1000, 1),
+            render=round(render * 1000, 1),
+            queries=recorder.count,
+            size=size,
+        )
@@ -0,0 +1,130 @@
+import copy
+import hashlib
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .cache import (
+    catalog_version_key, get_version, get_versions, recipe_version_key,
+    user_version_key, version_timestamp,
+)
+from foodgram.models import Ingredients, Recipe, Tag
+
+
+class CachedCatalogMixin:
+    """
+    Кеширование ответов справочника с поддержкой условных GET.
+    Версия справочника сдвигается сигналами при изменении модели,
+    она же служит ETag, а время её создания - Last-Modified.
+    """
+
+    cache_timeout = 60 * 60 * 24
+    cache_max_age = 60 * 5
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, view, request, *args, **kwargs):
+        version = get_version(catalog_version_key(self.queryset.model))
+        path = request.get_full_path()
+        etag = self.catalog_etag(
+            version, request.accepted_renderer.format, path)
+        last_modified = version_timestamp(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            cache_key = self.catalog_cache_key(version, path)
+            data = cache.get(cache_key)
+            if data is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                cache.set(cache_key, response.data, self.cache_timeout)
+            else:
+                response = Response(data)
+        return self.patch_catalog_headers(response, etag, last_modified)
+
+    @staticmethod
+    def catalog_etag(version, file_format, path):
+        return '"{}"'.format(hashlib.sha1(
+            f"{version}:{file_format}:{path}".encode()
+        ).hexdigest())
+
+    @staticmethod
+    def catalog_cache_key(version, path):
+        return f"catalog:{version}:{path}"
+
+    @classmethod
+    def patch_catalog_headers(cls, response, etag, last_modified):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=cls.cache_max_age)
+        return response
+
+
+class CachedRecipeMixin:
+    """
+    Кеширование рецепта (retrieve) в два слоя. Общая часть ответа
+    хранится по версиям рецепта, справочников тегов и ингредиентов
+    и профиля автора, их сдвигают сигналы api.signals. Флаги текущего
+    пользователя подставляются из одного лёгкого запроса.
+    """
+
+    recipe_cache_timeout = 60 * 60 * 24
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(kwargs[self.lookup_field])
+        if not pk.isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        recipe_version, tags_version, ingredients_version = get_versions(
+            recipe_version_key(pk),
+            catalog_version_key(Tag),
+            catalog_version_key(Ingredients),
+        )
+        # Ссылки на картинки абсолютные, поэтому хост входит в ключ.
+        cache_key = (
+            f"recipe:{pk}:{recipe_version}:{tags_version}:"
+            f"{ingredients_version}:{request.build_absolute_uri('/')}"
+        )
+        cached = cache.get(cache_key)
+        if cached is not None and cached["author_version"] == get_version(
+                user_version_key(cached["author_id"])):
+            flags = self.get_user_flags(pk)
+            if flags is None:
+                return super().retrieve(request, *args, **kwargs)
+            return Response(self.with_user_flags(cached["data"], flags))
+        response = super().retrieve(request, *args, **kwargs)
+        author_id = response.data["author"]["id"]
+        cache.set(cache_key, {
+            "author_id": author_id,
+            "author_version": get_version(user_version_key(author_id)),
+            "data": self.with_user_flags(response.data, {}),
+        }, self.recipe_cache_timeout)
+        return response
+
+    def get_user_flags(self, pk):
+        """
+        Флаги пользователя для рецепта; None, если рецепта уже нет.
+        Для анонимного пользователя запросов к базе нет.
+        """
+        if not self.request.user.is_authenticated:
+            return {}
+        return Recipe.objects.filter(id=pk).with_user_flags(
+            self.request.user
+        ).values(
+            "is_favorited", "is_in_shopping_cart", "is_subscribed"
+        ).first()
+
+    @staticmethod
+    def with_user_flags(data, flags):
+        data = copy.deepcopy(data)
+        data["is_favorited"] = flags.get("is_favorited", False)
+        data["is_in_shopping_cart"] = flags.get("is_in_shopping_cart", False)
+        data["author"]["is_subscribed"] = flags.get("is_subscribed", False)
+        return data
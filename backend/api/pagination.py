@@ -1,7 +1,44 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
-class CustomPagination(PageNumberPagination):
-    """Кастомный класс пагинации."""
+class IdCursorPagination(CursorPagination):
+    """Курсорная пагинация по -id, без OFFSET и COUNT(*)."""
     page_size = 6
     page_size_query_param = "limit"
+    ordering = "-id"
+
+    def decode_cursor(self, request):
+        # Пустой ?cursor= - первая страница.
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+
+class PageOnlyPagination(PageNumberPagination):
+    """
+    Только номера страниц, ?cursor= не учитывается: для выдачи
+    со своим порядком, который курсор по -id сломал бы.
+    """
+    page_size = 6
+    page_size_query_param = "limit"
+
+
+class CustomPagination(PageOnlyPagination):
+    """
+    Кастомный класс пагинации.
+    С параметром ?cursor= переключается на курсорную пагинацию.
+    """
+    cursor_query_param = IdCursorPagination.cursor_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = IdCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,15 +1,29 @@
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from .cache import bump_version, recipe_version_key
 from foodgram.models import (
-    IngredientAmount, Ingredients, Recipe, Subscribe, Tag,
+    AuthorCounter, IngredientAmount, Ingredients, Recipe, Subscribe, Tag,
+    recipe_prefetch_lookups,
 )
+from foodgram.search import update_search_documents
+from foodgram.signals import change_recipe_counter
 
 User = get_user_model()
 
+# Границы PositiveSmallIntegerField IngredientAmount.amount.
+MIN_AMOUNT = 1
+MAX_AMOUNT = 32767
+# Сколько рецептов можно добавить/убрать одним запросом.
+BULK_MAX_RECIPES = 100
+# Сколько ингредиентов можно указать для подбора рецептов.
+MATCH_MAX_INGREDIENTS = 50
+
 
 class CustomUserSerializer(UserCreateSerializer):
     """Сериализатор для создания User."""
@@ -34,14 +48,30 @@ class CustomUserSerializer(UserCreateSerializer):
         }
 
 
+class ImageVariantField(serializers.ImageField):
+    """URL варианта картинки; пока он не готов - URL оригинала."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, recipe):
+        return super().get_attribute(recipe) or recipe.image
+
+
 class RecipeGetSeriazlier(serializers.ModelSerializer):
     """Serializer для модели Recipe. GET"""
 
     image = Base64ImageField()
+    image_thumbnail = ImageVariantField()
+    image_webp = ImageVariantField()
 
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = (
+            "id", "name", "image", "image_thumbnail", "image_webp",
+            "cooking_time",
+        )
         read_only_fields = ("__all__",)
 
 
@@ -65,6 +95,8 @@ class ClassicUserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         """Получение данных о подписке."""
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         user = self.context.get("request").user
         if user.is_anonymous:
             return False
@@ -87,6 +119,20 @@ class IngredientsSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления/удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_RECIPES,
+    )
+
+    def validate_recipes(self, recipes):
+        """Повторы убираются, порядок сохраняется."""
+        return list(dict.fromkeys(recipes))
+
+
 class IngredientAmountSerializer(serializers.ModelSerializer):
     """Serializer для модели IgredientAmount."""
 
@@ -103,6 +149,30 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
                   "amount")
 
 
+def parse_ingredient(item):
+    """
+    Элемент ingredients рецепта: id, количество и ошибки по полям.
+    Поле с ошибкой возвращается как None.
+    """
+    if not isinstance(item, dict):
+        return None, None, {api_settings.NON_FIELD_ERRORS_KEY: [
+            "Ожидается объект с полями id и amount."]}
+    values, errors = {}, {}
+    for field in ("id", "amount"):
+        try:
+            values[field] = int(item[field])
+        except KeyError:
+            errors[field] = ["Обязательное поле."]
+        except (TypeError, ValueError):
+            errors[field] = ["Требуется целое число."]
+    amount = values.get("amount")
+    if amount is not None and not MIN_AMOUNT <= amount <= MAX_AMOUNT:
+        errors["amount"] = [
+            f"Количество должно быть от {MIN_AMOUNT} до {MAX_AMOUNT}."]
+        amount = None
+    return values.get("id"), amount, errors
+
+
 class RecipePostSerializer(serializers.ModelSerializer):
     """Serializer для модели Recipe. POST"""
 
@@ -113,6 +183,8 @@ class RecipePostSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_thumbnail = ImageVariantField()
+    image_webp = ImageVariantField()
 
     class Meta:
         model = Recipe
@@ -125,6 +197,8 @@ class RecipePostSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_thumbnail",
+            "image_webp",
             "text",
             "cooking_time",
         )
@@ -133,8 +207,21 @@ class RecipePostSerializer(serializers.ModelSerializer):
             "is_shopping_cart",
         )
 
+    def to_representation(self, recipe):
+        """
+        Передача флага подписки, посчитанного в queryset, автору.
+        Связанные объекты подгружаются пачкой, если их ещё нет
+        (например, после создания или изменения рецепта).
+        """
+        prefetch_related_objects([recipe], *recipe_prefetch_lookups())
+        if hasattr(recipe, "is_subscribed"):
+            recipe.author.is_subscribed = recipe.is_subscribed
+        return super().to_representation(recipe)
+
     def get_is_in_shopping_cart(self, obj):
         """Получение информации о нахождении рецепта."""
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         user = self.context.get("request").user
         if user.is_anonymous:
             return False
@@ -142,21 +229,59 @@ class RecipePostSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Получение списка изранного."""
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         user = self.context.get("request").user
         if user.is_anonymous:
             return False
         return Recipe.objects.filter(favorites__user=user, id=obj.id).exists()
 
-    def create_ingredients(self, ingredients, recipe):
-        """Получение ингредиентов для рецепта."""
-
-        for ingredient in ingredients:
-            IngredientAmount.objects.get_or_create(
-                recipe=recipe,
-                ingredient_id=ingredient.get("id"),
-                amount=ingredient.get("amount"),
-            )
-
+    def save_ingredients(self, recipe, ingredients, created=False):
+        """
+        Сохранение ингредиентов рецепта.
+        Новые, изменённые и удалённые ингредиенты записываются
+        одним запросом каждые.
+        """
+        amounts = {
+            int(item["id"]): int(item["amount"]) for item in ingredients
+        }
+        existing = {} if created else {
+            ingredient_amount.ingredient_id: ingredient_amount
+            for ingredient_amount in IngredientAmount.objects.filter(
+                recipe=recipe)
+        }
+        to_update = []
+        for ingredient_id, ingredient_amount in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != ingredient_amount.amount:
+                ingredient_amount.amount = amount
+                to_update.append(ingredient_amount)
+        to_delete = [
+            ingredient_amount.id
+            for ingredient_id, ingredient_amount in existing.items()
+            if ingredient_id not in amounts
+        ]
+        to_create = [
+            IngredientAmount(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        if to_delete:
+            IngredientAmount.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            IngredientAmount.objects.bulk_update(to_update, ("amount",))
+        if to_create:
+            IngredientAmount.objects.bulk_create(to_create)
+        # Счётчик ингредиентов меняется здесь, одним запросом.
+        if len(to_create) != len(to_delete):
+            change_recipe_counter(
+                IngredientAmount, (recipe.id,),
+                len(to_create) - len(to_delete))
+        bump_version(recipe_version_key(recipe.id))
+        update_search_documents((recipe.id,))
+
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
         image = validated_data.pop("image")
@@ -164,45 +289,55 @@ class RecipePostSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(image=image, **validated_data)
         tags_data = self.initial_data.get("tags")
         recipe.tags.set(tags_data)
-        self.create_ingredients(ingredients_data, recipe)
+        self.save_ingredients(recipe, ingredients_data, created=True)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         """Обновление данных о рецепте."""
+        if "image" in validated_data:
+            # Варианты пересоздаются в фоне, см. foodgram.signals.
+            recipe.image_thumbnail = recipe.image_webp = ""
         ingredients = validated_data.pop("ingredients")
-        recipe.ingredients.clear()
         tags = self.initial_data.get("tags")
-        self.create_ingredients(ingredients, recipe)
+        self.save_ingredients(recipe, ingredients)
         recipe.tags.set(tags)
         return super().update(recipe, validated_data)
 
     def validate(self, data):
         """Валидация рецепта."""
         ingredients = self.initial_data.get("ingredients")
-        if not ingredients:
+        if not ingredients or not isinstance(ingredients, list):
             raise serializers.ValidationError(
                 {
                     "ingredients": "Минимум один ингридиент"
                 }
             )
-        ingredient_list = []
-        for ingredient_item in ingredients:
-            ingredient = get_object_or_404(
-                Ingredients, id=ingredient_item["id"])
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    "Ингридиенты должны " "быть уникальными"
-                )
-            ingredient_list.append(ingredient)
-            if int(ingredient_item["amount"]) < 0:
-                raise serializers.ValidationError(
-                    {
-                        "ingredients": (
-                            "Убедитесь, что значение количества ингр. > 0."
-                        )
-                    }
-                )
-        data["ingredients"] = ingredients
+        errors = []
+        parsed = []
+        seen = set()
+        for item in ingredients:
+            ingredient_id, amount, item_errors = parse_ingredient(item)
+            if ingredient_id in seen:
+                item_errors.setdefault("id", []).append(
+                    "Ингредиент уже указан.")
+            elif ingredient_id is not None:
+                seen.add(ingredient_id)
+            errors.append(item_errors)
+            parsed.append((ingredient_id, amount))
+        found = set(Ingredients.objects.filter(
+            id__in=seen).values_list("id", flat=True))
+        for (ingredient_id, _), item_errors in zip(parsed, errors):
+            if ingredient_id is not None and ingredient_id not in found:
+                item_errors.setdefault("id", []).append(
+                    f"Ингредиент {ingredient_id} не найден.")
+        if any(errors):
+            # Ошибки по индексу элемента и полю, как у списка в DRF.
+            raise serializers.ValidationError({"ingredients": errors})
+        data["ingredients"] = [
+            {"id": ingredient_id, "amount": amount}
+            for ingredient_id, amount in parsed
+        ]
         return data
 
     def validate_cooking_time(self, cooking_time):
@@ -213,6 +348,21 @@ class RecipePostSerializer(serializers.ModelSerializer):
         return cooking_time
 
 
+def get_recipes_limit(request):
+    """Параметр recipes_limit из запроса: целое число >= 0 или None."""
+    limit = request.query_params.get("recipes_limit")
+    if not limit:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise serializers.ValidationError(
+            {"recipes_limit": "Укажите целое неотрицательное число."})
+    return limit
+
+
 class SubscribeSerializer(serializers.ModelSerializer):
     """Serializer для подписки."""
     id = serializers.ReadOnlyField(source="author.id")
@@ -238,20 +388,121 @@ class SubscribeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        """Получение подписок пользователя."""
-        return Subscribe.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
+        """Запись о подписке и есть подписка."""
+        return True
 
     def get_recipes(self, obj):
         """Получение рецептов пользователя."""
-        request = self.context.get("request")
-        limit = request.GET.get("recipes_limit")
-        queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[: int(limit)]
+        if hasattr(obj.author, "recipes_preview"):
+            queryset = obj.author.recipes_preview
+        else:
+            limit = get_recipes_limit(self.context.get("request"))
+            queryset = obj.author.recipes.all()[:limit]
         return RecipeGetSeriazlier(queryset, many=True).data
 
     def get_recipes_count(self, obj):
         """Получение количества рецептов пользователя."""
-        return Recipe.objects.filter(author=obj.author).count()
+        try:
+            return obj.author.counter.recipes_count
+        except AuthorCounter.DoesNotExist:
+            return 0
+
+
+class RecipeCardSerializer:
+    """
+    Короткая карточка рецепта для списка, GET /api/recipes/?fields=card.
+    Строки берутся из values(), поля DRF не используются.
+    """
+
+    fields_param = "card"
+    values = (
+        "id",
+        "name",
+        "image",
+        "image_thumbnail",
+        "cooking_time",
+        "author_id",
+        "author__username",
+        "author__first_name",
+        "author__last_name",
+        "is_favorited",
+        "is_in_shopping_cart",
+    )
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.request = (context or {}).get("request")
+
+    @classmethod
+    def get_queryset(cls, queryset):
+        """Queryset рецептов с флагами пользователя -> словари."""
+        return queryset.values(*cls.values)
+
+    def get_tags(self, recipe_ids):
+        """Теги всех рецептов страницы одним запросом."""
+        tags = {recipe_id: [] for recipe_id in recipe_ids}
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list(
+            "recipe_id", "tag_id", "tag__name", "tag__color", "tag__slug"
+        ).order_by("recipe_id", "tag_id")
+        for recipe_id, tag_id, name, color, slug in rows:
+            tags[recipe_id].append(
+                {"id": tag_id, "name": name, "color": color, "slug": slug})
+        return tags
+
+    def get_image_url(self, name):
+        url = Recipe._meta.get_field("image").storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, row, tags):
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "image_thumbnail": self.get_image_url(
+                row["image_thumbnail"] or row["image"]),
+            "cooking_time": row["cooking_time"],
+            "tags": tags,
+            "author": {
+                "id": row["author_id"],
+                "username": row["author__username"],
+                "first_name": row["author__first_name"],
+                "last_name": row["author__last_name"],
+            },
+            "is_favorited": row["is_favorited"],
+            "is_in_shopping_cart": row["is_in_shopping_cart"],
+        }
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        tags = self.get_tags([row["id"] for row in rows])
+        return [self.to_representation(row, tags[row["id"]]) for row in rows]
+
+
+class RecipeMatchSerializer(RecipeCardSerializer):
+    """Карточка рецепта с числом имеющихся и недостающих ингредиентов."""
+
+    values = RecipeCardSerializer.values + ("matched", "missing")
+
+    def to_representation(self, row, tags):
+        data = super().to_representation(row, tags)
+        data["ingredients_matched"] = row["matched"]
+        data["ingredients_missing"] = row["missing"]
+        return data
+
+
+class IngredientMatchSerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MATCH_MAX_INGREDIENTS,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_ingredients(self, ingredients):
+        return list(set(ingredients))
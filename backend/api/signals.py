@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import (
+    SHOPPING_LIST_VERSION_KEY, bump_version, catalog_version_key,
+    recipe_version_key, user_version_key,
+)
+from foodgram.images import image_processed
+from foodgram.models import Ingredients, Recipe, Tag
+from foodgram.signals import catalog_loaded
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_fields(sender, instance, **kwargs):
+    """Новая версия рецепта при изменении или удалении."""
+    bump_version(recipe_version_key(instance.id))
+
+
+@receiver(image_processed, sender=Recipe)
+def invalidate_recipe_image(sender, recipe_id, **kwargs):
+    """Готовы варианты картинки рецепта."""
+    bump_version(recipe_version_key(recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """Новая версия рецепта при изменении его тегов."""
+    if not action.startswith("post_"):
+        return
+    recipe_ids = (pk_set or ()) if reverse else (instance.id,)
+    for recipe_id in recipe_ids:
+        bump_version(recipe_version_key(recipe_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    """Новая версия профиля: устаревают рецепты с этим автором."""
+    bump_version(user_version_key(instance.id))
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+def invalidate_all_shopping_lists(sender, **kwargs):
+    """Сброс кеша всех списков покупок при изменении ингредиента."""
+    bump_version(SHOPPING_LIST_VERSION_KEY)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete, catalog_loaded), sender=Ingredients)
+def invalidate_catalog(sender, **kwargs):
+    """Новая версия справочника: ответы и ETag клиентов устаревают."""
+    bump_version(catalog_version_key(sender))
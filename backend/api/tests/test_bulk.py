@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .test_queries import create_recipes, create_user
+from foodgram.models import Recipe
+
+
+class RecipeListsCountersTest(TestCase):
+    """Счётчики меняются ровно на вставленные или удалённые строки."""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = create_user("reader")
+        self.recipes = create_recipes([create_user("author")], 4, [], [])
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def post(self, recipe_ids):
+        return self.client.post(
+            "/api/recipes/favorite/", {"recipes": recipe_ids}, format="json")
+
+    def test_counters(self):
+        first, second, third, _ = (recipe.id for recipe in self.recipes)
+        self.client.post(f"/api/recipes/{first}/favorite/")
+        response = self.post([first, second, third, 10 ** 6])
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["already_added", "added", "added", "not_found"],
+        )
+        self.post([second, third])
+        counts = dict(Recipe.objects.values_list("id", "favorites_count"))
+        self.assertEqual(
+            [counts[recipe.id] for recipe in self.recipes], [1, 1, 1, 0])
+
+    def counts(self, field):
+        counts = dict(Recipe.objects.values_list("id", field))
+        return [counts[recipe.id] for recipe in self.recipes]
+
+    def test_single_and_bulk(self):
+        first, second, *_ = (recipe.id for recipe in self.recipes)
+        self.post([first, second])
+        self.assertEqual(
+            self.client.post(f"/api/recipes/{first}/favorite/").status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.client.delete(f"/api/recipes/{second}/favorite/")
+        self.client.delete(
+            "/api/recipes/favorite/", {"recipes": [first]}, format="json")
+        self.assertEqual(self.counts("favorites_count"), [0, 0, 0, 0])
+
+    def test_clear_cart(self):
+        recipe_ids = [recipe.id for recipe in self.recipes]
+        self.client.post(
+            "/api/recipes/shopping_cart/", {"recipes": recipe_ids},
+            format="json")
+        self.assertEqual(self.counts("cart_count"), [1, 1, 1, 1])
+        # Блокировка, чтение, DELETE и одно обновление счётчиков;
+        # SAVEPOINT и RELEASE - от транзакции теста.
+        with self.assertNumQueries(6):
+            response = self.client.delete("/api/recipes/shopping_cart/clear/")
+        self.assertEqual(response.data, {"removed": len(recipe_ids)})
+        self.assertEqual(self.counts("cart_count"), [0, 0, 0, 0])
+
+    def test_delete_user(self):
+        self.post([recipe.id for recipe in self.recipes])
+        self.reader.delete()
+        self.assertEqual(self.counts("favorites_count"), [0, 0, 0, 0])
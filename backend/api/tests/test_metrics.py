@@ -0,0 +1,31 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .test_queries import create_recipes, create_user
+
+
+@override_settings(API_METRICS=True)
+class QueryMetricsTest(TestCase):
+    """Заголовок Server-Timing со временем сериализации."""
+
+    def setUp(self):
+        create_recipes([create_user("author")], 20, [], [])
+        self.client = APIClient()
+
+    def timings(self, url):
+        header = self.client.get(url)["Server-Timing"]
+        return {
+            name: float(duration.split("=")[1])
+            for name, duration, *_ in (
+                part.strip().split(";") for part in header.split(","))
+        }
+
+    def test_serialize(self):
+        for url in ("/api/recipes/", "/api/recipes/?fields=card"):
+            timings = self.timings(url)
+            self.assertGreater(timings["serialize"], 0)
+            self.assertAlmostEqual(
+                timings["view"] + timings["serialize"] + timings["render"],
+                timings["total"],
+                delta=0.2,
+            )
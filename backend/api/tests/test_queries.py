@@ -0,0 +1,280 @@
+from api.filter import get_tag_ids
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from foodgram.models import (
+    AuthorCounter, Favorite, IngredientAmount, Ingredients, Recipe,
+    ShoppingCart, Subscribe, Tag, TimelineEntry,
+)
+from foodgram.timeline import FANOUT_MAX_FOLLOWERS
+
+User = get_user_model()
+
+PAGE_SIZES = (6, 50, 200)
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@foodgram.ru",
+        password="Secret-pass-123",
+        first_name=username,
+        last_name=username,
+    )
+
+
+def create_recipes(authors, count, tags, ingredients):
+    """Рецепты по кругу от авторов, у каждого все теги и ингредиенты."""
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=authors[i % len(authors)],
+            name=f"Рецепт {i}",
+            image="backend/recipe.jpg",
+            text="Описание",
+            cooking_time=10,
+        )
+        for i in range(count)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe in recipes for tag in tags
+    )
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(recipe=recipe, ingredient=ingredient, amount=100)
+        for recipe in recipes for ingredient in ingredients
+    )
+    return recipes
+
+
+class QueryCountTestCase(TestCase):
+    """Общие данные: теги, ингредиенты и читатель с клиентом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user("reader")
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f"Тег {i}", slug=f"tag{i}", color=f"#00000{i}")
+            for i in range(2)
+        )
+        cls.ingredients = Ingredients.objects.bulk_create(
+            Ingredients(name=f"Ингредиент {i}", measurement_unit="г")
+            for i in range(3)
+        )
+
+    def setUp(self):
+        # Версии кеша сдвигаются после коммита, которого в TestCase нет.
+        cache.clear()
+        # Slug тегов для фильтра кешируются первым же запросом.
+        get_tag_ids()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+
+class RecipeListQueriesTest(QueryCountTestCase):
+    """Список рецептов: число запросов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        authors = [create_user(f"author{i}") for i in range(3)]
+        cls.recipes = create_recipes(
+            authors, max(PAGE_SIZES), cls.tags, cls.ingredients)
+        cls.favorited = {recipe.id for recipe in cls.recipes[::3]}
+        cls.in_cart = {recipe.id for recipe in cls.recipes[::5]}
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.reader, recipe_id=recipe_id)
+            for recipe_id in cls.favorited
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.reader, recipe_id=recipe_id)
+            for recipe_id in cls.in_cart
+        )
+        Subscribe.objects.create(user=cls.reader, author=authors[0])
+        cls.subscribed_author = authors[0].id
+
+    def test_authenticated_list(self):
+        for page_size in PAGE_SIZES:
+            with self.subTest(limit=page_size), self.assertNumQueries(4):
+                response = self.client.get(
+                    "/api/recipes/", {"limit": page_size})
+            self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_anonymous_list(self):
+        client = APIClient()
+        for page_size in PAGE_SIZES:
+            with self.subTest(limit=page_size), self.assertNumQueries(4):
+                response = client.get("/api/recipes/", {"limit": page_size})
+            self.assertEqual(len(response.data["results"]), page_size)
+            self.assertFalse(any(
+                recipe["is_favorited"] for recipe in response.data["results"]
+            ))
+
+    def test_user_flags(self):
+        """Флаги из Exists-аннотаций совпадают с данными."""
+        response = self.client.get(
+            "/api/recipes/", {"limit": max(PAGE_SIZES)})
+        for recipe in response.data["results"]:
+            self.assertEqual(
+                recipe["is_favorited"], recipe["id"] in self.favorited)
+            self.assertEqual(
+                recipe["is_in_shopping_cart"], recipe["id"] in self.in_cart)
+            self.assertEqual(
+                recipe["author"]["is_subscribed"],
+                recipe["author"]["id"] == self.subscribed_author,
+            )
+            self.assertEqual(len(recipe["tags"]), len(self.tags))
+            self.assertEqual(
+                len(recipe["ingredients"]), len(self.ingredients))
+
+    def test_filtered_list(self):
+        for page_size in PAGE_SIZES:
+            with self.subTest(limit=page_size), self.assertNumQueries(4):
+                response = self.client.get("/api/recipes/", {
+                    "limit": page_size,
+                    "tags": self.tags[0].slug,
+                    "is_favorited": 1,
+                })
+            self.assertTrue(all(
+                recipe["is_favorited"] for recipe in response.data["results"]
+            ))
+
+    def test_card_list(self):
+        for page_size in PAGE_SIZES:
+            with self.subTest(limit=page_size), self.assertNumQueries(3):
+                self.client.get(
+                    "/api/recipes/", {"limit": page_size, "fields": "card"})
+
+
+class SubscriptionsQueriesTest(QueryCountTestCase):
+    """Подписки: число запросов не зависит от числа авторов на странице."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        authors = [create_user(f"author{i}") for i in range(60)]
+        create_recipes(authors, 3 * len(authors), cls.tags, cls.ingredients)
+        Subscribe.objects.bulk_create(
+            Subscribe(user=cls.reader, author=author) for author in authors)
+
+    def test_subscriptions(self):
+        for page_size in (6, 50):
+            with self.subTest(limit=page_size), self.assertNumQueries(3):
+                response = self.client.get(
+                    "/api/users/subscriptions/",
+                    {"limit": page_size, "recipes_limit": 2},
+                )
+            self.assertEqual(len(response.data["results"]), page_size)
+            for author in response.data["results"]:
+                self.assertEqual(len(author["recipes"]), 2)
+
+
+class MatchQueriesTest(QueryCountTestCase):
+    """Подбор по ингредиентам: порядок по недостающим и без курсора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredients += Ingredients.objects.bulk_create(
+            Ingredients(name=f"Ингредиент {i}", measurement_unit="г")
+            for i in range(3, 6)
+        )
+        author = create_user("author")
+        # У рецепта i - первые 1 + i % 6 ингредиентов.
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f"Рецепт {i}",
+                image="backend/recipe.jpg",
+                text="Описание",
+                cooking_time=10,
+                ingredients_count=1 + i % len(cls.ingredients),
+            )
+            for i in range(120)
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient, amount=100)
+            for recipe in recipes
+            for ingredient in cls.ingredients[:recipe.ingredients_count]
+        )
+        cls.params = {
+            "ingredients": ",".join(
+                str(ingredient.id) for ingredient in cls.ingredients[:2]),
+        }
+
+    def test_match(self):
+        for page_size in (6, 50):
+            with self.subTest(limit=page_size), self.assertNumQueries(3):
+                response = self.client.get(
+                    "/api/recipes/match/", {**self.params, "limit": page_size})
+            self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_ranking(self):
+        response = self.client.get(
+            "/api/recipes/match/", {**self.params, "limit": 120})
+        missing = [
+            recipe["ingredients_missing"]
+            for recipe in response.data["results"]
+        ]
+        self.assertEqual(missing, sorted(missing))
+
+    def test_cursor_ignored(self):
+        """?cursor= не переключает выдачу на порядок по -id."""
+        expected = self.client.get(
+            "/api/recipes/match/", {**self.params, "limit": 50})
+        response = self.client.get(
+            "/api/recipes/match/",
+            {**self.params, "limit": 50, "cursor": ""},
+        )
+        self.assertEqual(response.data["count"], expected.data["count"])
+        self.assertEqual(
+            response.data["results"], expected.data["results"])
+
+
+class FeedQueriesTest(QueryCountTestCase):
+    """
+    Лента: таблица ленты и рецепты тяжёлого автора сливаются по -id,
+    число запросов не зависит от размера страницы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        authors = [create_user(f"author{i}") for i in range(4)]
+        recipes = create_recipes(authors, 120, cls.tags, cls.ingredients)
+        Subscribe.objects.bulk_create(
+            Subscribe(user=cls.reader, author=author) for author in authors)
+        heavy_author = authors[-1]
+        AuthorCounter.objects.update_or_create(
+            author=heavy_author,
+            defaults={
+                "followers_count": FANOUT_MAX_FOLLOWERS + 1,
+                "recipes_count": 30,
+            },
+        )
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user=cls.reader, recipe=recipe, author_id=recipe.author_id)
+            for recipe in recipes if recipe.author_id != heavy_author.id
+        )
+        cls.recipe_ids = sorted(
+            (recipe.id for recipe in recipes), reverse=True)
+
+    def test_feed(self):
+        for page_size in (6, 50):
+            # Тяжёлый автор - один запрос его последних рецептов.
+            with self.subTest(limit=page_size), self.assertNumQueries(6):
+                response = self.client.get(
+                    "/api/users/feed/", {"limit": page_size})
+            self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_order(self):
+        recipe_ids = []
+        for page in (1, 2, 3):
+            response = self.client.get(
+                "/api/users/feed/", {"limit": 50, "page": page})
+            recipe_ids.extend(
+                recipe["id"] for recipe in response.data["results"])
+        self.assertEqual(response.data["count"], len(self.recipe_ids))
+        self.assertEqual(recipe_ids, self.recipe_ids)
@@ -0,0 +1,42 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .test_queries import create_recipes, create_user
+from foodgram.models import Favorite, RecipeRating
+from foodgram.rankings import COMMIT_LAG, refresh_rankings
+
+
+class RefreshRankingsTest(TestCase):
+    """Каждое добавление учитывается ровно один раз."""
+
+    def setUp(self):
+        self.reader = create_user("reader")
+        self.recipes = create_recipes([create_user("author")], 2, [], [])
+
+    def favorite(self, recipe, age):
+        favorite = Favorite.objects.create(user=self.reader, recipe=recipe)
+        Favorite.objects.filter(pk=favorite.pk).update(
+            created=timezone.now() - age)
+
+    def test_late_commit(self):
+        old, late = self.recipes
+        self.favorite(old, timedelta(hours=1))
+        self.assertEqual(refresh_rankings(), (1, 1))
+        self.assertEqual(refresh_rankings(), (0, 0))
+        # created уже в прошлом, но строка появилась только сейчас.
+        self.favorite(late, COMMIT_LAG / 2)
+        self.assertEqual(refresh_rankings(), (0, 0))
+        later = timezone.now() + COMMIT_LAG
+        with mock.patch("foodgram.rankings.timezone.now", return_value=later):
+            self.assertEqual(refresh_rankings(), (1, 1))
+            self.assertEqual(refresh_rankings(), (0, 0))
+        self.assertEqual(RecipeRating.objects.count(), 2)
+
+    def test_full(self):
+        for recipe in self.recipes:
+            self.favorite(recipe, timedelta(hours=1))
+        refresh_rankings()
+        self.assertEqual(refresh_rankings(full=True), (2, 2))
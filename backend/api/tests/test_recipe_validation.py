@@ -0,0 +1,70 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .test_queries import create_user
+from foodgram.models import Ingredients, Recipe, Tag
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+class RecipeIngredientsValidationTest(TestCase):
+    """Ошибки ингредиентов - по индексу элемента и имени поля."""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(create_user("author"))
+        self.tag = Tag.objects.create(name="Тег", slug="tag", color="#000000")
+        self.ingredient = Ingredients.objects.create(
+            name="Соль", measurement_unit="г")
+
+    def post(self, ingredients):
+        return self.client.post("/api/recipes/", {
+            "name": "Рецепт",
+            "text": "Описание",
+            "cooking_time": 10,
+            "image": image_data(),
+            "tags": [self.tag.id],
+            "ingredients": ingredients,
+        }, format="json")
+
+    def test_errors_by_index(self):
+        ingredient_id = self.ingredient.id
+        response = self.post([
+            {"id": ingredient_id, "amount": 10},
+            {"id": ingredient_id, "amount": 0},
+            {"id": 10 ** 6, "amount": "много"},
+            {"amount": 5},
+            "соль",
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data["ingredients"]
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(errors[0], {})
+        self.assertEqual(set(errors[1]), {"id", "amount"})
+        self.assertEqual(set(errors[2]), {"id", "amount"})
+        self.assertEqual(set(errors[3]), {"id"})
+        self.assertEqual(set(errors[4]), {"non_field_errors"})
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_valid(self):
+        response = self.post([{"id": self.ingredient.id, "amount": 10}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
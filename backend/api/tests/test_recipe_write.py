@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+
+from api.filter import get_tag_ids
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .test_queries import create_user
+from .test_recipe_validation import image_data
+from foodgram.models import Ingredients, Recipe, Tag
+
+
+class RecipeIngredientsWriteTest(TestCase):
+    """Запись ингредиентов рецепта через API."""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(create_user("author"))
+        self.tag = Tag.objects.create(name="Тег", slug="tag", color="#000000")
+        self.ingredients = Ingredients.objects.bulk_create(
+            Ingredients(name=f"Ингредиент {i}", measurement_unit="г")
+            for i in range(60)
+        )
+        response = self.client.post("/api/recipes/", {
+            "name": "Рецепт",
+            "text": "Описание",
+            "cooking_time": 10,
+            "image": image_data(),
+            "tags": [self.tag.id],
+            "ingredients": self.amounts(self.ingredients[:30]),
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.recipe_id = response.data["id"]
+        get_tag_ids()
+
+    @staticmethod
+    def amounts(ingredients):
+        return [
+            {"id": ingredient.id, "amount": 10} for ingredient in ingredients
+        ]
+
+    def test_replace_ingredients(self):
+        response = self.client.patch(
+            f"/api/recipes/{self.recipe_id}/",
+            {
+                "tags": [self.tag.id],
+                "ingredients": self.amounts(self.ingredients[30:]),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        recipe = Recipe.objects.get(id=self.recipe_id)
+        self.assertEqual(recipe.ingredients_count, 30)
+        self.assertIn("Ингредиент 59", recipe.search_document)
+        self.assertNotIn("Ингредиент 0\n", recipe.search_document)
+
+    def test_replace_queries(self):
+        """Число запросов не зависит от числа заменённых ингредиентов."""
+        with self.assertNumQueries(19):
+            self.client.patch(
+                f"/api/recipes/{self.recipe_id}/",
+                {
+                    "tags": [self.tag.id],
+                    "ingredients": self.amounts(self.ingredients[30:]),
+                },
+                format="json",
+            )
+
+    def test_delete_queries(self):
+        with self.assertNumQueries(10):
+            response = self.client.delete(f"/api/recipes/{self.recipe_id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_delete_ingredient(self):
+        self.ingredients[0].delete()
+        recipe = Recipe.objects.get(id=self.recipe_id)
+        self.assertEqual(recipe.ingredients_count, 29)
+        self.assertNotIn("Ингредиент 0\n", recipe.search_document)
@@ -0,0 +1,31 @@
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .test_queries import create_recipes, create_user
+from foodgram.models import Subscribe
+
+
+class SubscribeTest(TestCase):
+    """Подписка через POST /api/users/{id}/subscribe/."""
+
+    def setUp(self):
+        self.reader = create_user("reader")
+        self.author = create_user("author")
+        create_recipes([self.author], 3, [], [])
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.url = f"/api/users/{self.author.id}/subscribe/"
+
+    def test_recipes_limit(self):
+        response = self.client.post(f"{self.url}?recipes_limit=2")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["recipes"]), 2)
+
+    def test_bad_recipes_limit(self):
+        for limit in ("abc", "-1"):
+            response = self.client.post(f"{self.url}?recipes_limit={limit}")
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("recipes_limit", response.data)
+        self.assertFalse(Subscribe.objects.exists())
@@ -0,0 +1,38 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .test_queries import create_recipes, create_user
+from foodgram.models import TimelineEntry
+from foodgram.timeline import TIMELINE_MAX_ENTRIES
+
+
+class TrimTimelinesTest(TestCase):
+    """Обрезка лент, которые никто не читает."""
+
+    def setUp(self):
+        self.author = create_user("author")
+        self.readers = [create_user(f"reader{i}") for i in range(2)]
+        self.recipes = create_recipes(
+            [self.author], TIMELINE_MAX_ENTRIES + 10, [], [])
+
+    def fill(self, user, recipes):
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user=user, recipe=recipe, author=self.author)
+            for recipe in recipes
+        )
+
+    def test_trim_timelines(self):
+        long_reader, short_reader = self.readers
+        self.fill(long_reader, self.recipes)
+        self.fill(short_reader, self.recipes[:10])
+        call_command("trim_timelines", stdout=StringIO())
+        kept = TimelineEntry.objects.filter(
+            user=long_reader).values_list("recipe_id", flat=True)
+        self.assertEqual(
+            set(kept),
+            {recipe.id for recipe in self.recipes[-TIMELINE_MAX_ENTRIES:]},
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=short_reader).count(), 10)
@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewset
+from .async_views import async_urls
+from .views import (
+    IngredientViewSet, MetricsView, RecipeViewSet, TagViewSet, UserViewset,
+)
 
 app_name = "api"
 router = routers.DefaultRouter()
@@ -10,8 +14,13 @@ router.register("tags", TagViewSet, basename="tags")
 router.register("ingredients", IngredientViewSet, basename="ingredients")
 router.register("users", UserViewset, basename="users")
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    router_urls = async_urls(router_urls)
+
 urlpatterns = [
-    path("", include(router.urls)),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    path("", include(router_urls)),
     path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
 ]
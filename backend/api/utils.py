@@ -1,25 +1,148 @@
-from django.http import HttpResponse
+import csv
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+FONT_NAME = "Fonts"
+FONT_PATH = os.path.join(settings.BASE_DIR, "Fonts.ttf")
 
-def download_shooping_card(x):
-    """Функция для скачивания shopping_card."""
-    pdfmetrics.registerFont(
-        TTFont("Fonts", "Fonts.ttf", "UTF-8"))
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = ("attachment; "
-                                       "filename='shopping_list.pdf'")
-    page = canvas.Canvas(response)
-    page.setFont("Fonts", size=24)
-    page.drawString(200, 800, "Список ингредиентов")
-    page.setFont("Fonts", size=16)
-    height = 750
-    for i, (name, data) in enumerate(x.items(), 1):
-        page.drawString(75, height, (f"<{i}> {name} - {data['amount']}, "
-                                     f"{data['measurement_unit']}"))
-        height -= 25
+FILENAME = "shopping_list"
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "txt": "text/plain; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+# Готовые файлы больше этого размера не кешируются.
+CACHE_MAX_SIZE = 1024 * 1024
+CACHE_TIMEOUT = 60 * 60 * 24
+TITLE = "Список ингредиентов"
+CSV_HEADER = ("name", "measurement_unit", "amount")
+
+# Разметка страницы pdf.
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 50
+LINE_HEIGHT = 25
+
+
+def register_fonts():
+    """Регистрация шрифта для pdf, один раз при старте."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def shopping_list_cache_key(user_id, recipe_ids, versions, file_format):
+    """Ключ кеша по отпечатку содержимого корзины."""
+    fingerprint = hashlib.sha1(
+        f"{','.join(map(str, recipe_ids))}:{','.join(versions)}".encode()
+    ).hexdigest()
+    return f"shopping_list:{user_id}:{file_format}:{fingerprint}"
+
+
+class Echo:
+    """Файлоподобный объект, который возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_lines(ingredients):
+    """Строки списка покупок."""
+    for i, item in enumerate(ingredients, 1):
+        yield (f"{i}. {item['name']} - {item['total_amount']}, "
+               f"{item['measurement_unit']}")
+
+
+def render_txt(ingredients):
+    """Список покупок в txt, построчно."""
+    yield f"{TITLE}\n\n"
+    for line in shopping_list_lines(ingredients):
+        yield f"{line}\n"
+
+
+def render_csv(ingredients):
+    """Список покупок в csv, построчно."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for item in ingredients:
+        yield writer.writerow((
+            item["name"], item["measurement_unit"], item["total_amount"]))
+
+
+def render_pdf(ingredients):
+    """Список покупок в pdf с переносом на новые страницы."""
+    buffer = tempfile.TemporaryFile()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    page.setFont(FONT_NAME, size=24)
+    page.drawString(200, PAGE_HEIGHT - MARGIN, TITLE)
+    page.setFont(FONT_NAME, size=16)
+    height = PAGE_HEIGHT - MARGIN - 2 * LINE_HEIGHT
+    for line in shopping_list_lines(ingredients):
+        if height < MARGIN:
+            page.showPage()
+            page.setFont(FONT_NAME, size=16)
+            height = PAGE_HEIGHT - MARGIN
+        page.drawString(75, height, line)
+        height -= LINE_HEIGHT
     page.showPage()
     page.save()
+    buffer.seek(0)
+    return buffer
+
+
+def cache_chunks(chunks, cache_key):
+    """Отдаёт части файла и кеширует его целиком, если он небольшой."""
+    cached, size = [], 0
+    for chunk in chunks:
+        chunk = chunk.encode()
+        size += len(chunk)
+        if size <= CACHE_MAX_SIZE:
+            cached.append(chunk)
+        yield chunk
+    if size <= CACHE_MAX_SIZE:
+        cache.set(cache_key, b"".join(cached), CACHE_TIMEOUT)
+
+
+def attachment(response, file_format):
+    response["Content-Disposition"] = (
+        f'attachment; filename="{FILENAME}.{file_format}"')
     return response
+
+
+def download_shooping_card(ingredients, file_format="pdf", cache_key=None):
+    """Функция для скачивания shopping_card."""
+    content_type = CONTENT_TYPES[file_format]
+    if cache_key is not None:
+        content = cache.get(cache_key)
+        if content is not None:
+            return attachment(
+                HttpResponse(content, content_type=content_type),
+                file_format)
+    if file_format == "pdf":
+        document = render_pdf(ingredients)
+        if cache_key is not None and (
+                os.fstat(document.fileno()).st_size <= CACHE_MAX_SIZE):
+            cache.set(cache_key, document.read(), CACHE_TIMEOUT)
+            document.seek(0)
+        return FileResponse(
+            document,
+            as_attachment=True,
+            filename=f"{FILENAME}.pdf",
+            content_type=content_type,
+        )
+    renders = {
+        "txt": render_txt,
+        "csv": render_csv,
+    }
+    chunks = renders[file_format](ingredients)
+    if cache_key is not None:
+        chunks = cache_chunks(chunks, cache_key)
+    return attachment(
+        StreamingHttpResponse(chunks, content_type=content_type),
+        file_format)
@@ -1,23 +1,38 @@
-from api.pagination import CustomPagination
+from api.pagination import CustomPagination, PageOnlyPagination
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch, Sum
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from .cache import (
+    SHOPPING_LIST_VERSION_KEY, bump_version, get_versions, recipe_version_key,
+    shopping_list_version_key,
+)
 from .filter import AuthorAndTagFilter, IngredientsFilter
+from .middleware import registry
+from .mixins import CachedCatalogMixin, CachedRecipeMixin
 from .permissions import AdminOrReadOnly, AuthorOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, TXTRenderer
 from .serializers import (
-    IngredientsSerializer, RecipeGetSeriazlier, RecipePostSerializer,
-    SubscribeSerializer, TagSerializer,
+    IngredientMatchSerializer, IngredientsSerializer, RecipeCardSerializer,
+    RecipeGetSeriazlier, RecipeIdsSerializer, RecipeMatchSerializer,
+    RecipePostSerializer, SubscribeSerializer, TagSerializer,
+    get_recipes_limit,
 )
-from .utils import download_shooping_card
+from .utils import download_shooping_card, shopping_list_cache_key
+from foodgram import timeline
 from foodgram.models import (
     Favorite, IngredientAmount, Ingredients, Recipe, ShoppingCart, Subscribe,
     Tag,
 )
+from foodgram.signals import change_recipe_counter
 
 User = get_user_model()
 
@@ -34,45 +49,58 @@ class UserViewset(UserViewSet):
     )
     def subscribe(self, request, id=None):
         """Подписка/Отписка."""
-        author = get_object_or_404(User, id=id)
-        if request.method == "POST":
-            if request.user == author:
-                return Response({
-                    "errors": "Нельзя подписываться на себя."},
-                    status=status.HTTP_400_BAD_REQUEST)
-            if Subscribe.objects.filter(user=request.user,
-                                        author=author).exists():
-                return Response({
-                    "errors": "Вы уже подписаны на данного пользователя"},
-                    status=status.HTTP_400_BAD_REQUEST)
-
-            follow = Subscribe.objects.create(user=request.user, author=author)
-            serializer = SubscribeSerializer(
-                follow, context={"request": request}
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
         if request.method == "DELETE":
-            if request.user == author:
-                return Response({
-                    "errors": "Нельзя подписываться на себя."},
-                    status=status.HTTP_400_BAD_REQUEST)
-            follow = Subscribe.objects.filter(user=request.user, author=author)
-            if follow.exists():
-                follow.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-
+            return self.unsubscribe(request, id)
+        # recipes_limit нужен для ответа; проверяется до создания подписки.
+        get_recipes_limit(request)
+        author = get_object_or_404(User, id=id)
+        if request.user == author:
             return Response({
-                "errors": "Вы уже отписались"
-            }, status=status.HTTP_400_BAD_REQUEST)
+                "errors": "Нельзя подписываться на себя."},
+                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Повторную подписку отсекает unique_following.
+            with transaction.atomic():
+                follow = Subscribe.objects.create(
+                    user=request.user, author=author)
+        except IntegrityError:
+            return Response({
+                "errors": "Вы уже подписаны на данного пользователя"},
+                status=status.HTTP_400_BAD_REQUEST)
+        serializer = SubscribeSerializer(
+            follow, context={"request": request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        return None
+    def unsubscribe(self, request, id):
+        """Отписка одним DELETE, автор проверяется только при ошибке."""
+        deleted, _ = Subscribe.objects.filter(
+            user=request.user, author_id=id).delete()
+        if deleted:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        author = get_object_or_404(User, id=id)
+        if request.user == author:
+            return Response({
+                "errors": "Нельзя подписываться на себя."},
+                status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "errors": "Вы уже отписались"
+        }, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         """Список подписок пользователя."""
         user = request.user
-        queryset = Subscribe.objects.filter(user=user)
+        limit = get_recipes_limit(request)
+        recipes = Recipe.objects.all()
+        if limit is not None:
+            recipes = recipes.first_per_author(limit)
+        queryset = Subscribe.objects.filter(user=user).select_related(
+            "author__counter"
+        ).order_by("-id").prefetch_related(
+            Prefetch("author__recipes", queryset=recipes,
+                     to_attr="recipes_preview")
+        )
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(
             pages,
@@ -81,8 +109,26 @@ class UserViewset(UserViewSet):
         )
         return self.get_paginated_response(serializer.data)
 
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=PageOnlyPagination,
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов из подписок, новые сверху. Страница
+        собирается из готовой ленты пользователя, см. foodgram.timeline,
+        поэтому только постраничная выдача, без курсора.
+        """
+        recipes = RecipeCardSerializer.get_queryset(
+            Recipe.objects.with_user_flags(request.user))
+        page = self.paginate_queryset(timeline.Feed(request.user, recipes))
+        serializer = RecipeCardSerializer(
+            page, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для модели Tag.
     Могут создавать только админы.
@@ -94,7 +140,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для модели Ingredients.
     Могут создавать только админы.
@@ -104,17 +150,51 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AdminOrReadOnly,)
     serializer_class = IngredientsSerializer
     filter_backends = (IngredientsFilter,)
-    search_fields = ("^name",)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedRecipeMixin, viewsets.ModelViewSet):
     """ViewSet для модеил Recipe."""
 
     queryset = Recipe.objects.all()
     serializer_class = RecipePostSerializer
     pagination_class = CustomPagination
-    filter_class = AuthorAndTagFilter
+    filterset_class = AuthorAndTagFilter
     permission_classes = (AuthorOrReadOnly,)
+    # Действия, которые отдают полное представление рецепта.
+    full_representation_actions = (
+        "list", "retrieve", "update", "partial_update",
+    )
+
+    def is_card_list(self):
+        """Список в коротком виде, ?fields=card."""
+        return (
+            self.action == "list"
+            and self.request.query_params.get("fields")
+            == RecipeCardSerializer.fields_param
+        )
+
+    def get_queryset(self):
+        """Рецепты с флагами текущего пользователя."""
+        queryset = Recipe.objects.with_user_flags(self.request.user)
+        if self.is_card_list():
+            return RecipeCardSerializer.get_queryset(queryset)
+        if self.action in self.full_representation_actions:
+            return queryset.with_related()
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов; с ?fields=card - короткие карточки."""
+        if not self.is_card_list():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeCardSerializer(
+            queryset if page is None else page,
+            context=self.get_serializer_context(),
+        )
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     def perform_create(self, serializer):
         """Создание рецепта."""
@@ -146,43 +226,233 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.delete_obj(ShoppingCart, request.user, pk)
         return None
 
+    @action(
+        detail=False,
+        methods=("get",),
+        pagination_class=PageOnlyPagination,
+    )
+    def match(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов:
+        ?ingredients=1,2,3 (или ?ingredients=1&ingredients=2),
+        ?max_missing=N - не больше N недостающих ингредиентов.
+        Ранжирование - одним агрегирующим запросом в базе, поэтому
+        только постраничная выдача, без курсора.
+        """
+        serializer = IngredientMatchSerializer(data={
+            **request.query_params.dict(),
+            "ingredients": [
+                ingredient_id
+                for value in request.query_params.getlist("ingredients")
+                for ingredient_id in value.split(",") if ingredient_id
+            ],
+        })
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        queryset = Recipe.objects.with_user_flags(
+            request.user
+        ).with_ingredient_match(params["ingredients"])
+        if "max_missing" in params:
+            queryset = queryset.filter(missing__lte=params["max_missing"])
+        queryset = RecipeMatchSerializer.get_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeMatchSerializer(
+            queryset if page is None else page,
+            context=self.get_serializer_context(),
+        )
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=("delete", "post"),
+        permission_classes=(IsAuthenticated,),
+        url_path="favorite",
+        url_name="favorite-bulk",
+    )
+    def favorite_bulk(self, request):
+        """Добавить/убрать несколько рецептов в избранное или из него."""
+        return self.bulk_obj(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=("delete", "post"),
+        permission_classes=(IsAuthenticated,),
+        url_path="shopping_cart",
+        url_name="shopping-cart-bulk",
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавление/удаление нескольких рецептов в/из корзины."""
+        return self.bulk_obj(ShoppingCart, request)
+
+    @action(
+        detail=False,
+        methods=("delete",),
+        permission_classes=(IsAuthenticated,),
+        url_path="shopping_cart/clear",
+    )
+    def clear_shopping_cart(self, request):
+        """Очистка корзины."""
+        with transaction.atomic():
+            self.lock_lists(request.user)
+            cart = ShoppingCart.objects.filter(user=request.user)
+            removed = list(cart.values_list("recipe_id", flat=True))
+            cart.delete()
+            self.list_changed(ShoppingCart, request.user, removed, -1)
+        return Response({"removed": len(removed)}, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def lock_lists(user):
+        """
+        Избранное и корзина одного пользователя меняются по очереди:
+        строка пользователя блокируется до конца транзакции, поэтому
+        прочитанное до записи совпадает с тем, что запрос вставил или
+        удалил, и счётчики меняются ровно на это.
+        """
+        User.objects.select_for_update().filter(pk=user.pk).first()
+
+    @staticmethod
+    def list_changed(model, user, recipe_ids, delta):
+        """
+        Счётчики рецептов и кеш списка покупок: строки списков пишутся
+        и удаляются пачками, без сигналов по строкам.
+        """
+        if not recipe_ids:
+            return
+        change_recipe_counter(model, recipe_ids, delta)
+        if model is ShoppingCart:
+            bump_version(shopping_list_version_key(user.id))
+
+    def bulk_obj(self, model, request):
+        """
+        Массовое добавление/удаление: {"recipes": [id, ...]}.
+        В ответе - результат для каждого id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
+        if request.method == "POST":
+            listed, added = self.bulk_add(model, request.user, recipe_ids)
+            results = [
+                {"id": recipe_id,
+                 "status": "added" if recipe_id in added
+                 else "already_added" if recipe_id in listed
+                 else "not_found"}
+                for recipe_id in recipe_ids
+            ]
+        else:
+            listed = self.bulk_remove(model, request.user, recipe_ids)
+            results = [
+                {"id": recipe_id,
+                 "status": "removed" if recipe_id in listed
+                 else "not_listed"}
+                for recipe_id in recipe_ids
+            ]
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    def bulk_add(self, model, user, recipe_ids):
+        """
+        Добавление рецептов в список. Возвращает id, которые уже были
+        в списке, и id, которые вставил этот запрос.
+        """
+        with transaction.atomic():
+            self.lock_lists(user)
+            listed = set(model.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list("recipe_id", flat=True))
+            added = set(Recipe.objects.filter(
+                id__in=recipe_ids
+            ).exclude(id__in=listed).values_list("id", flat=True))
+            model.objects.bulk_create(
+                model(user=user, recipe_id=recipe_id) for recipe_id in added)
+            self.list_changed(model, user, added, 1)
+        return listed, added
+
+    def bulk_remove(self, model, user, recipe_ids):
+        """Удаление рецептов из списка; возвращает удалённые id."""
+        with transaction.atomic():
+            self.lock_lists(user)
+            rows = model.objects.filter(user=user, recipe_id__in=recipe_ids)
+            listed = set(rows.values_list("recipe_id", flat=True))
+            rows.delete()
+            self.list_changed(model, user, listed, -1)
+        return listed
+
     def add_obj(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipe = get_object_or_404(Recipe, id=pk)
+        with transaction.atomic():
+            self.lock_lists(user)
+            _, created = model.objects.get_or_create(user=user, recipe=recipe)
+            if created:
+                self.list_changed(model, user, (recipe.id,), 1)
+        if not created:
             return Response(
                 {"errors": "Рецепт уже добавлен в список"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
         serializer = RecipeGetSeriazlier(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_obj(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        with transaction.atomic():
+            self.lock_lists(user)
+            deleted, _ = model.objects.filter(
+                user=user, recipe_id=pk).delete()
+            if deleted:
+                self.list_changed(model, user, (pk,), -1)
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"errors": "Рецепт уже удален"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    @action(detail=False, methods=("get",),
-            permission_classes=(IsAuthenticated,))
+    @action(
+        detail=False,
+        methods=("get",),
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PDFRenderer, TXTRenderer, CSVRenderer),
+    )
     def download_shopping_cart(self, request):
-        final_list = {}
+        """Выгрузка списка покупок в pdf, txt или csv (?format=)."""
+        file_format = request.accepted_renderer.format
+        recipe_ids = list(ShoppingCart.objects.filter(
+            user=request.user
+        ).order_by("recipe_id").values_list("recipe_id", flat=True))
+        versions = get_versions(
+            SHOPPING_LIST_VERSION_KEY,
+            shopping_list_version_key(request.user.id),
+            *map(recipe_version_key, recipe_ids),
+        )
+        cache_key = shopping_list_cache_key(
+            request.user.id, recipe_ids, versions, file_format)
         ingredients = IngredientAmount.objects.filter(
-            recipe__cart__user=request.user).values_list(
-            "ingredient__name",
-            "ingredient__measurement_unit",
-            "amount")
-        for item in ingredients:
-            name = item[0]
-            if name not in final_list:
-                final_list[name] = {
-                    "measurement_unit": item[1],
-                    "amount": item[2]
-                }
-            else:
-                final_list[name]["amount"] += item[2]
-
-        return download_shooping_card(final_list)
+            recipe__cart__user=request.user
+        ).values(
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
+        ).annotate(
+            total_amount=Sum("amount")
+        ).order_by("name")
+        return download_shooping_card(
+            ingredients.iterator(), file_format, cache_key)
+
+
+class MetricsView(APIView):
+    """
+    Отчёт по замерам QueryMetricsMiddleware этого процесса:
+    p50/p95 времени, числа запросов и размера ответа по маршрутам.
+    DELETE сбрасывает накопленные замеры.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({
+            "enabled": settings.API_METRICS,
+            "routes": registry.report(),
+        })
+
+    def delete(self, request):
+        registry.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
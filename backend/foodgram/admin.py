@@ -1,6 +1,7 @@
 from django.contrib.admin import ModelAdmin, TabularInline, register
 
 from .models import IngredientAmount, Ingredients, Recipe, Subscribe, Tag
+from .search import update_search_documents
 
 
 class IngredientInline(TabularInline):
@@ -13,14 +14,36 @@ class RecipeAdmin(ModelAdmin):
     """Админка для модели Рецепта."""
 
     empty_value_display = "-пусто-"
-    list_display = ("author", "name", "text", "cooking_time")
+    list_display = (
+        "author", "name", "text", "cooking_time", "favorites_count")
+    readonly_fields = (
+        "favorites_count", "cart_count", "image_thumbnail", "image_webp")
 
-    search_fields = ("name", "author", "tags")
+    search_fields = ("name", "author__username", "tags__name")
 
     list_filter = ("tags",)
 
     inlines = (IngredientInline,)
 
+    def save_model(self, request, obj, form, change):
+        """Для новой картинки варианты создаются заново."""
+        if "image" in form.changed_data:
+            obj.image_thumbnail = obj.image_webp = ""
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        """
+        Ингредиенты из инлайна сохраняются после рецепта: счётчик
+        и документ для поиска обновляются один раз, когда они уже
+        записаны.
+        """
+        super().save_related(request, form, formsets, change)
+        recipe = form.instance
+        Recipe.objects.filter(id=recipe.id).update(
+            ingredients_count=IngredientAmount.objects.filter(
+                recipe=recipe).count())
+        update_search_documents((recipe.id,))
+
 
 @register(Ingredients)
 class IngredientsAdmin(ModelAdmin):
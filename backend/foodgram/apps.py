@@ -1,5 +1,29 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def check_search_index(using, **kwargs):
+    """
+    На SQLite миграции пересобирают таблицу рецептов вместе с
+    триггерами поиска, поэтому они проверяются после каждой миграции.
+    """
+    from .search import install_search_index
+
+    connection = connections[using]
+    if "foodgram_recipe" not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        columns = connection.introspection.get_table_description(
+            cursor, "foodgram_recipe")
+    if any(column.name == "search_document" for column in columns):
+        install_search_index(connection)
 
 
 class FoodgramConfig(AppConfig):
     name = 'foodgram'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(check_search_index, sender=self)
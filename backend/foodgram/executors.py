@@ -0,0 +1,21 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def create_executor(name, max_workers):
+    return ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix=name)
+
+
+def get_executor(name, max_workers):
+    """
+    Пул потоков name, общий для процесса. Создаётся при первой задаче:
+    уже в процессе воркера gunicorn, а не в мастер-процессе до fork.
+    """
+    with _lock:
+        return create_executor(name, max_workers)
@@ -0,0 +1,102 @@
+import logging
+import os
+
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+from .executors import get_executor
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Карточка в списке и полноразмерная WebP-версия.
+THUMBNAIL_SIZE = (600, 600)
+WEBP_SIZE = (1280, 1280)
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# Варианты картинки записаны через update(), в обход post_save.
+image_processed = Signal()
+
+
+def to_rgb(image):
+    """JPEG не хранит прозрачность: фон делается белым."""
+    if image.mode == "RGB":
+        return image
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def render(image, size, file_format, **options):
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, file_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def process_recipe_image(recipe_id):
+    """
+    Создание картинки для карточки и WebP-версии.
+    Возвращает False, если рецепт удалён или картинку успели заменить.
+    """
+    recipe = Recipe.objects.filter(id=recipe_id).only(
+        "image", "image_thumbnail", "image_webp").first()
+    if recipe is None or not recipe.image:
+        return False
+    original = recipe.image.name
+    with recipe.image.open("rb") as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    name = os.path.splitext(os.path.basename(original))[0]
+    recipe.image_thumbnail.save(
+        f"{name}.jpg",
+        render(to_rgb(image), THUMBNAIL_SIZE, "JPEG",
+               quality=JPEG_QUALITY, optimize=True),
+        save=False,
+    )
+    recipe.image_webp.save(
+        f"{name}.webp",
+        render(image, WEBP_SIZE, "WEBP", quality=WEBP_QUALITY),
+        save=False,
+    )
+    if Recipe.objects.filter(id=recipe_id, image=original).update(
+            image_thumbnail=recipe.image_thumbnail.name,
+            image_webp=recipe.image_webp.name):
+        image_processed.send(sender=Recipe, recipe_id=recipe_id)
+        return True
+    recipe.image_thumbnail.delete(save=False)
+    recipe.image_webp.delete(save=False)
+    return False
+
+
+def run(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception("Не удалось обработать картинку рецепта %s",
+                         recipe_id)
+    finally:
+        # Соединения с базой у каждого потока свои.
+        connections.close_all()
+
+
+def schedule_image_processing(recipe_id):
+    """
+    Обработка картинки в пуле потоков после коммита транзакции.
+    При IMAGE_WORKERS = 0 картинки обрабатывает только команда
+    process_images.
+    """
+    if settings.IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor(
+                "recipe-images", settings.IMAGE_WORKERS
+            ).submit(run, recipe_id))
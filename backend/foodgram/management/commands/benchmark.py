@@ -0,0 +1,197 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from api.metrics import percentile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Команды запуска: синхронные воркеры gunicorn и uvicorn-воркеры ASGI.
+SERVERS = {
+    "wsgi": ("foodgram_.wsgi:application",),
+    "asgi": (
+        "foodgram_.asgi:application",
+        "--worker-class", "uvicorn_worker.UvicornWorker",
+    ),
+}
+DEFAULT_PATHS = (
+    "/api/tags/",
+    "/api/ingredients/?name=%D1%81",
+    "/api/recipes/?limit=6",
+    "/api/recipes/?limit=6&fields=card",
+)
+START_TIMEOUT = 30
+# Адрес из ALLOWED_HOSTS.
+HOST = "localhost"
+
+
+def process_tree(pid):
+    """Процесс gunicorn и его воркеры, по /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, ()))
+    return tree
+
+
+def rss_mb(pid):
+    """Суммарная резидентная память процесса и воркеров, МБ."""
+    total = 0
+    for tree_pid in process_tree(pid):
+        try:
+            with open(f"/proc/{tree_pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total / 1024
+
+
+class Load:
+    """Запросы по кругу из нескольких потоков, у каждого своя сессия."""
+
+    def __init__(self, base_url, paths, headers):
+        self.base_url = base_url
+        self.paths = paths
+        self.headers = headers
+        self.local = threading.local()
+
+    def get(self, path):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            session.headers.update(self.headers)
+        start = time.perf_counter()
+        response = session.get(self.base_url + path)
+        return time.perf_counter() - start, response.status_code < 400
+
+    def run(self, total, concurrency):
+        with ThreadPoolExecutor(concurrency) as executor:
+            return list(executor.map(
+                self.get,
+                (self.paths[i % len(self.paths)] for i in range(total)),
+            ))
+
+
+class Command(BaseCommand):
+    """
+    Сравнение WSGI (синхронные воркеры gunicorn) и ASGI (uvicorn-воркеры)
+    при одинаковом числе процессов: запросов в секунду, p50 и p99
+    задержки и память всех процессов сервера. База и настройки -
+    как у manage.py. --background нагружает сервер медленными
+    запросами, например выгрузкой pdf, на время замера.
+    """
+
+    help = "Compares WSGI and ASGI throughput and latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="*", default=DEFAULT_PATHS,
+            help="Адреса для замера, по кругу.")
+        parser.add_argument(
+            "--modes", nargs="+", choices=SERVERS, default=list(SERVERS))
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--token", help="Токен для заголовка Authorization.")
+        parser.add_argument(
+            "--background", action="append", default=[],
+            help="Медленный адрес для фоновой нагрузки.")
+        parser.add_argument(
+            "--background-concurrency", type=int, default=4)
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options["token"]:
+            headers["Authorization"] = f"Token {options['token']}"
+        self.stdout.write(
+            f"{'mode':<6}{'rps':>10}{'p50, ms':>10}{'p99, ms':>10}"
+            f"{'errors':>8}{'rss, MB':>10}")
+        for mode in options["modes"]:
+            server = self.start_server(mode, options)
+            try:
+                self.measure(mode, server, headers, options)
+            finally:
+                server.terminate()
+                server.wait()
+
+    def start_server(self, mode, options):
+        bind = f"{HOST}:{options['port']}"
+        server = subprocess.Popen(
+            (
+                sys.executable, "-m", "gunicorn", *SERVERS[mode],
+                "--workers", str(options["workers"]),
+                "--bind", bind,
+                "--log-level", "warning",
+            ),
+            cwd=settings.BASE_DIR,
+        )
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"{mode}: сервер не запустился.")
+            try:
+                requests.get(f"http://{bind}{options['paths'][0]}")
+                return server
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"{mode}: сервер не ответил за {START_TIMEOUT} с.")
+
+    def measure(self, mode, server, headers, options):
+        base_url = f"http://{HOST}:{options['port']}"
+        load = Load(base_url, list(options["paths"]), headers)
+        # Прогрев: воркеры загружают код, кеши заполняются.
+        load.run(options["workers"] * 10 * len(options["paths"]),
+                 options["concurrency"])
+        stop = threading.Event()
+        background = Load(base_url, options["background"], headers)
+        threads = [
+            threading.Thread(target=self.background, args=(background, stop))
+            for _ in range(options["background_concurrency"])
+        ] if options["background"] else []
+        for thread in threads:
+            thread.start()
+        try:
+            start = time.perf_counter()
+            results = load.run(options["requests"], options["concurrency"])
+            elapsed = time.perf_counter() - start
+            rss = rss_mb(server.pid)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        latencies = [latency * 1000 for latency, _ in results]
+        errors = sum(not ok for _, ok in results)
+        self.stdout.write(
+            f"{mode:<6}{len(results) / elapsed:>10.1f}"
+            f"{percentile(latencies, 0.5):>10.1f}"
+            f"{percentile(latencies, 0.99):>10.1f}"
+            f"{errors:>8}{rss:>10.1f}")
+
+    @staticmethod
+    def background(load, stop):
+        i = 0
+        while not stop.is_set():
+            load.get(load.paths[i % len(load.paths)])
+            i += 1
@@ -0,0 +1,219 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Sum
+
+from foodgram.models import (
+    Favorite, IngredientAmount, Ingredients, Recipe, ShoppingCart, Subscribe,
+)
+from foodgram.search import search_recipes
+
+User = get_user_model()
+
+# Признаки полного просмотра таблицы и сортировки без индекса в плане.
+# Виртуальная таблица FTS5 с ограничением в строке индекса (M - MATCH,
+# = - rowid) читается по своему индексу, а не целиком.
+FULL_SCAN = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(
+        r"\bSCAN (?:TABLE )?(\w+)\b(?! VIRTUAL TABLE INDEX \d+:\S)"),
+}
+# Ингредиентов в тестовых данных и сколько из них в каждом рецепте:
+# у каждого ингредиента мало рецептов, как в настоящей базе.
+SEED_INGREDIENTS = 50
+SEED_RECIPE_INGREDIENTS = 3
+SORT = {
+    "postgresql": re.compile(r"\bSort\s+\("),
+    "sqlite": re.compile(r"USE TEMP B-TREE FOR ORDER BY"),
+}
+
+
+class RollbackError(Exception):
+    pass
+
+
+def get_checks(user, author, recipe_ids):
+    """
+    Запросы из api.views: название, queryset, таблицы, которые можно
+    читать целиком, и должен ли порядок строк браться из индекса.
+    """
+    return (
+        (
+            "RecipeViewSet.list: флаги пользователя",
+            Recipe.objects.with_user_flags(user)[:6],
+            ("foodgram_recipe",),
+            False,
+        ),
+        (
+            "RecipeViewSet.list: ингредиенты рецептов",
+            IngredientAmount.objects.filter(
+                recipe_id__in=recipe_ids).order_by(),
+            (),
+            False,
+        ),
+        (
+            "AuthorAndTagFilter: рецепты автора",
+            Recipe.objects.filter(author=author).order_by("-id")[:6],
+            (),
+            True,
+        ),
+        (
+            "AuthorAndTagFilter: поиск",
+            search_recipes(Recipe.objects.all(), "explain")[:6],
+            (),
+            False,
+        ),
+        (
+            "RecipeViewSet.match",
+            Recipe.objects.with_ingredient_match(list(
+                Ingredients.objects.values_list("id", flat=True)[:3]))[:6],
+            (),
+            False,
+        ),
+        (
+            "RecipeViewSet.favorite",
+            Favorite.objects.filter(user=user, recipe_id=recipe_ids[0]),
+            (),
+            False,
+        ),
+        (
+            "RecipeViewSet.shopping_cart",
+            ShoppingCart.objects.filter(user=user, recipe_id=recipe_ids[0]),
+            (),
+            False,
+        ),
+        (
+            "RecipeViewSet.download_shopping_cart",
+            IngredientAmount.objects.filter(
+                recipe__cart__user=user
+            ).values(
+                name=F("ingredient__name"),
+            ).annotate(total_amount=Sum("amount")).order_by("name"),
+            ("foodgram_ingredients",),
+            False,
+        ),
+        (
+            "UserViewset.subscribe",
+            Subscribe.objects.filter(user=user, author=author),
+            (),
+            False,
+        ),
+        (
+            "UserViewset.subscriptions",
+            Subscribe.objects.filter(user=user).order_by("-id"),
+            (),
+            False,
+        ),
+    )
+
+
+def seed(size):
+    """Тестовые данные: size рецептов, каждый в избранном и корзине."""
+    User.objects.bulk_create(
+        User(username=f"explain_{i}", email=f"explain_{i}@example.com")
+        for i in range(max(size // 10, 2))
+    )
+    users = list(User.objects.filter(username__startswith="explain_"))
+    Ingredients.objects.bulk_create(
+        Ingredients(name=f"explain_{i}", measurement_unit="г")
+        for i in range(SEED_INGREDIENTS)
+    )
+    ingredients = list(Ingredients.objects.filter(
+        name__startswith="explain_"))
+    Recipe.objects.bulk_create(
+        Recipe(author=users[i % len(users)], name=f"explain_{i}",
+               image="explain.png", text="explain", cooking_time=1)
+        for i in range(size)
+    )
+    recipes = list(Recipe.objects.filter(name__startswith="explain_"))
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(
+            recipe=recipe,
+            ingredient=ingredients[(i + j) % len(ingredients)],
+            amount=1,
+        )
+        for i, recipe in enumerate(recipes)
+        for j in range(SEED_RECIPE_INGREDIENTS)
+    )
+    for model in (Favorite, ShoppingCart):
+        model.objects.bulk_create(
+            model(user=users[i % len(users)], recipe=recipe)
+            for i, recipe in enumerate(recipes)
+        )
+    Subscribe.objects.bulk_create(
+        Subscribe(user=user, author=author)
+        for user in users for author in users if user != author
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+class Command(BaseCommand):
+    """
+    EXPLAIN для запросов api.views: проверяет, что горячие таблицы
+    читаются по индексам. Ошибка, если найдено чтение всей таблицы.
+    """
+
+    help = "Runs EXPLAIN on the API queries and reports missing indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Заполнить базу N тестовыми рецептами (откатывается).",
+        )
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Печатать планы целиком.",
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in FULL_SCAN:
+            raise CommandError(f"База {vendor} не поддерживается.")
+        problems = []
+        try:
+            with transaction.atomic():
+                if vendor == "postgresql":
+                    # Если индекс можно использовать, планировщик его выберет.
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET LOCAL enable_seqscan = off")
+                if options["seed"]:
+                    seed(options["seed"])
+                problems = self.check_queries(options)
+                raise RollbackError
+        except RollbackError:
+            pass
+        if problems:
+            raise CommandError(
+                "Запросы без индекса:\n" + "\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("Все запросы идут по индексам."))
+
+    def check_queries(self, options):
+        user = Subscribe.objects.values_list("user", flat=True).first()
+        author = Subscribe.objects.values_list("author", flat=True).first()
+        recipe_ids = list(Recipe.objects.values_list("id", flat=True)[:6])
+        if not (user and author and recipe_ids):
+            raise CommandError(
+                "В базе нет рецептов и подписок, запустите с --seed N.")
+        user = User.objects.get(id=user)
+        problems = []
+        for name, queryset, allowed, ordered in get_checks(
+                user, author, recipe_ids):
+            plan = queryset.explain()
+            if options["verbose_plans"]:
+                self.stdout.write(f"{name}:\n{plan}\n")
+            errors = [
+                f"полный просмотр {table}"
+                for table in FULL_SCAN[connection.vendor].findall(plan)
+                if table not in allowed
+            ]
+            if ordered and SORT[connection.vendor].search(plan):
+                errors.append("сортировка без индекса")
+            problems.extend(f"{name}: {error}" for error in errors)
+            self.stdout.write(f"{'FAIL' if errors else 'OK'}  {name}")
+        return problems
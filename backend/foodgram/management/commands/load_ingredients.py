@@ -1,26 +1,115 @@
 import csv
+import json
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from foodgram.models import Ingredients
+from foodgram.signals import catalog_loaded
+
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, "data", "ingredients.csv")
+FORMATS = ("csv", "json")
+BATCH_SIZE = 1000
 
 ALREDY_LOADED_ERROR_MESSAGE = "Ингредиенты уже загружены."
 
 
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item["name"], item["measurement_unit"]
+
+
+READERS = {
+    "csv": read_csv,
+    "json": read_json,
+}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
 class Command(BaseCommand):
-    """Загрузка ингредиента в файл json."""
+    """Загрузка ингредиентов из csv или json пачками."""
 
-    help = "Loads data from ingredients.csv"
+    help = "Loads data from ingredients.csv or ingredients.json"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=DEFAULT_PATH,
+            help="Файл с ингредиентами.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Формат файла, по умолчанию - по расширению.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Количество строк в одном INSERT.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Прочитать файл, ничего не записывая в базу.",
+        )
 
     def handle(self, *args, **options):
-        with open("data/ingredients.csv", newline="", encoding="utf-8") as f:
-            csv_reader = csv.reader(f)
-            next(csv_reader)
-            for row in csv_reader:
-                Ingredients.objects.get_or_create(
-                    name=row[0], measurement_unit=row[1])
-            if Ingredients.objects.exists():
-                print("Ингредиенты успешно загружены.")
-                print(ALREDY_LOADED_ERROR_MESSAGE)
-                return
-        print("Ингредиенты загружаются.")
+        path = options["path"]
+        file_format = (
+            options["format"] or os.path.splitext(path)[1].lstrip(".")
+        )
+        if file_format not in READERS:
+            raise CommandError(
+                f"Неизвестный формат файла: {file_format}. "
+                f"Укажите --format {'|'.join(FORMATS)}.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля.")
+
+        start = time.monotonic()
+        rows = 0
+        before = Ingredients.objects.count()
+        with open(path, newline="", encoding="utf-8") as file:
+            with transaction.atomic():
+                for batch in batches(
+                        READERS[file_format](file), options["batch_size"]):
+                    rows += len(batch)
+                    if options["dry_run"]:
+                        continue
+                    Ingredients.objects.bulk_create(
+                        (Ingredients(name=name, measurement_unit=unit)
+                         for name, unit in batch),
+                        ignore_conflicts=True,
+                    )
+        created = Ingredients.objects.count() - before
+        elapsed = time.monotonic() - start
+
+        self.stdout.write(
+            f"Прочитано строк: {rows} за {elapsed:.2f} с "
+            f"({rows / elapsed if elapsed else rows:.0f} строк/с).")
+        if options["dry_run"]:
+            self.stdout.write("Пробный запуск, база не изменена.")
+        elif created:
+            catalog_loaded.send(sender=Ingredients)
+            self.stdout.write(self.style.SUCCESS(
+                f"Ингредиенты успешно загружены: {created}."))
+        else:
+            self.stdout.write(ALREDY_LOADED_ERROR_MESSAGE)
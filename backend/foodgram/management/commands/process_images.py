@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.images import process_recipe_image
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Обработка картинок рецептов, которые не успел обработать фоновый
+    пул: перезапуск сервера, IMAGE_WORKERS = 0 или старые рецепты.
+    """
+
+    help = "Creates thumbnails and WebP variants of recipe images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересоздать варианты для всех рецептов.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Обработать не больше N рецептов.",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="").order_by("id")
+        if not options["all"]:
+            recipes = recipes.filter(image_thumbnail="")
+        recipe_ids = list(
+            recipes.values_list("id", flat=True)[:options["limit"]])
+        processed = failed = 0
+        for recipe_id in recipe_ids:
+            try:
+                processed += process_recipe_image(recipe_id)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"Рецепт {recipe_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано картинок: {processed} из {len(recipe_ids)}."))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"С ошибками: {failed}."))
@@ -0,0 +1,51 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from foodgram.models import (
+    AuthorCounter, Favorite, IngredientAmount, Recipe, ShoppingCart, Subscribe,
+)
+
+
+def count_related(model, field):
+    """Подзапрос: количество строк model, ссылающихся на объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef("pk")}).order_by().values(
+            field).annotate(count=Count("pk")).values("count")
+    ), 0)
+
+
+class Command(BaseCommand):
+    """Пересчёт денормализованных счётчиков рецептов и авторов."""
+
+    help = (
+        "Rebuilds favorites_count, cart_count, ingredients_count, "
+        "recipes_count and followers_count"
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.update(
+            favorites_count=count_related(Favorite, "recipe"),
+            cart_count=count_related(ShoppingCart, "recipe"),
+            ingredients_count=count_related(IngredientAmount, "recipe"),
+        )
+        counters = defaultdict(dict)
+        for model, field in (
+            (Recipe, "recipes_count"),
+            (Subscribe, "followers_count"),
+        ):
+            for row in model.objects.order_by().values("author").annotate(
+                    count=Count("pk")):
+                counters[row["author"]][field] = row["count"]
+        AuthorCounter.objects.all().delete()
+        authors = AuthorCounter.objects.bulk_create(
+            AuthorCounter(author_id=author_id, **fields)
+            for author_id, fields in counters.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Счётчики пересчитаны: рецептов {recipes}, "
+            f"авторов {len(authors)}."))
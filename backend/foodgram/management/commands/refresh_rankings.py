@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    """
+    Пересчёт рейтингов popular/trending. Запускается по расписанию
+    (cron) или в цикле с --interval; обычный запуск учитывает только
+    новые добавления в избранное и корзину.
+    """
+
+    help = "Refreshes popular and trending recipe rankings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пересчитать рейтинги с нуля.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            help="Повторять пересчёт каждые N секунд.",
+        )
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        while True:
+            start = time.monotonic()
+            recipes, events = refresh_rankings(full=full)
+            self.stdout.write(self.style.SUCCESS(
+                f"Рейтинги обновлены: рецептов {recipes}, событий {events} "
+                f"за {time.monotonic() - start:.2f} с."))
+            if not options["interval"]:
+                return
+            full = False
+            time.sleep(options["interval"])
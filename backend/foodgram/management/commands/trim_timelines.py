@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram.timeline import TIMELINE_MAX_ENTRIES, trim_all
+
+
+class Command(BaseCommand):
+    """
+    Обрезка лент подписчиков до TIMELINE_MAX_ENTRIES записей.
+    Запускается по расписанию (cron) или в цикле с --interval.
+    """
+
+    help = "Trims subscription timelines to the newest entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            help="Повторять обрезку каждые N секунд.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.monotonic()
+            trimmed = trim_all()
+            self.stdout.write(self.style.SUCCESS(
+                f"Лент обрезано до {TIMELINE_MAX_ENTRIES} записей: "
+                f"{trimmed} за {time.monotonic() - start:.2f} с."))
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEX_NAME = "foodgram_ingredients_name_trgm"
+
+
+def create_name_index(apps, schema_editor):
+    """
+    Триграммный индекс для поиска ингредиентов по подстроке.
+    Django строит icontains/istartswith как UPPER(name) LIKE UPPER(%s),
+    поэтому индекс построен по тому же выражению.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+        "ON foodgram_ingredients USING gin (UPPER(name) gin_trgm_ops)"
+    )
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef("pk")}).order_by().values(
+            field).annotate(count=Count("pk")).values("count")
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model("foodgram", "Recipe")
+    Favorite = apps.get_model("foodgram", "Favorite")
+    ShoppingCart = apps.get_model("foodgram", "ShoppingCart")
+    AuthorCounter = apps.get_model("foodgram", "AuthorCounter")
+    Recipe.objects.update(
+        favorites_count=count_related(Favorite, "recipe"),
+        cart_count=count_related(ShoppingCart, "recipe"),
+    )
+    AuthorCounter.objects.bulk_create(
+        AuthorCounter(author_id=row["author"], recipes_count=row["count"])
+        for row in Recipe.objects.order_by().values("author").annotate(
+            count=Count("pk"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0002_ingredients_name_trgm_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorCounter',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='Количество рецептов')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзине'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
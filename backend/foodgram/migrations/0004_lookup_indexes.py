@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:09
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    """Оставляет по одной записи избранного на пару (user, recipe)."""
+    Favorite = apps.get_model("foodgram", "Favorite")
+    Recipe = apps.get_model("foodgram", "Recipe")
+    duplicates = Favorite.objects.order_by().values(
+        "user", "recipe"
+    ).annotate(
+        first_id=Min("id"), count=Count("id")
+    ).filter(count__gt=1)
+    for row in duplicates:
+        Favorite.objects.filter(
+            user=row["user"], recipe=row["recipe"]
+        ).exclude(id=row["first_id"]).delete()
+    Recipe.objects.update(favorites_count=Coalesce(Subquery(
+        Favorite.objects.filter(recipe=OuterRef("pk")).order_by().values(
+            "recipe").annotate(count=Count("pk")).values("count")
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredientamount',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique recipe ingredients'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='ingredientamount',
+            name='unique ingredients recipe',
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_desc_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique favorite user'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:18
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# Копия SQL из foodgram.search на момент миграции: миграция не должна
+# меняться вместе с модулем.
+SEARCH_CONFIG = "russian"
+TSVECTOR = (
+    f"(setweight(to_tsvector('{SEARCH_CONFIG}', "
+    "\"foodgram_recipe\".\"name\"), 'A') || "
+    f"to_tsvector('{SEARCH_CONFIG}', "
+    "\"foodgram_recipe\".\"search_document\"))"
+)
+PG_INDEX_NAME = "foodgram_recipe_search_gin"
+FTS_TABLE = "foodgram_recipe_search"
+FTS_TRIGGERS = {
+    f"{FTS_TABLE}_insert": (
+        "AFTER INSERT ON foodgram_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, search_document) "
+        "VALUES (new.id, new.name, new.search_document); END"
+    ),
+    f"{FTS_TABLE}_delete": (
+        "AFTER DELETE ON foodgram_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, search_document) "
+        "VALUES ('delete', old.id, old.name, old.search_document); END"
+    ),
+    f"{FTS_TABLE}_update": (
+        "AFTER UPDATE OF name, search_document ON foodgram_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, search_document) "
+        "VALUES ('delete', old.id, old.name, old.search_document); "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, search_document) "
+        "VALUES (new.id, new.name, new.search_document); END"
+    ),
+}
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model("foodgram", "Recipe")
+    IngredientAmount = apps.get_model("foodgram", "IngredientAmount")
+    ingredient_names = defaultdict(list)
+    for recipe_id, name in IngredientAmount.objects.values_list(
+            "recipe_id", "ingredient__name").order_by("ingredient__name"):
+        ingredient_names[recipe_id].append(name)
+    recipes = list(Recipe.objects.only("id", "name", "text"))
+    for recipe in recipes:
+        recipe.search_document = "\n".join(
+            (recipe.name, recipe.text, *ingredient_names[recipe.id]))
+    Recipe.objects.bulk_update(recipes, ("search_document",), 500)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} "
+            f"ON foodgram_recipe USING gin ({TSVECTOR})")
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, search_document, content='foodgram_recipe', "
+            "content_rowid='id')")
+        for name, trigger in FTS_TRIGGERS.items():
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            schema_editor.execute(f"CREATE TRIGGER {name} {trigger}")
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def remove_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PG_INDEX_NAME}")
+    elif vendor == "sqlite":
+        for name in FTS_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0005_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Поисковый документ'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, remove_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_ingredients_count(apps, schema_editor):
+    Recipe = apps.get_model("foodgram", "Recipe")
+    IngredientAmount = apps.get_model("foodgram", "IngredientAmount")
+    Recipe.objects.update(ingredients_count=Coalesce(Subquery(
+        IngredientAmount.objects.filter(recipe=OuterRef("pk")).order_by(
+        ).values("recipe").annotate(count=Count("pk")).values("count")
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0006_recipe_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ингредиентов'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredientamount',
+            index=models.Index(fields=['ingredient', 'recipe'], name='ingredient_recipe_idx'),
+        ),
+        migrations.RunPython(
+            fill_ingredients_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+# Значения из foodgram.timeline на момент миграции.
+TIMELINE_MAX_ENTRIES = 500
+FANOUT_MAX_FOLLOWERS = 5000
+
+
+def fill_timelines(apps, schema_editor):
+    Recipe = apps.get_model("foodgram", "Recipe")
+    Subscribe = apps.get_model("foodgram", "Subscribe")
+    AuthorCounter = apps.get_model("foodgram", "AuthorCounter")
+    TimelineEntry = apps.get_model("foodgram", "TimelineEntry")
+    for row in Subscribe.objects.order_by().values("author").annotate(
+            count=Count("pk")):
+        AuthorCounter.objects.update_or_create(
+            author_id=row["author"],
+            defaults={"followers_count": row["count"]})
+    for user_id, author_id in Subscribe.objects.exclude(
+        author__counter__followers_count__gt=FANOUT_MAX_FOLLOWERS
+    ).values_list("user_id", "author_id"):
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+            for recipe_id in Recipe.objects.filter(
+                author_id=author_id
+            ).order_by("-id").values_list(
+                "id", flat=True
+            )[:TIMELINE_MAX_ENTRIES]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0007_ingredient_match'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorcounter',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков'),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foodgram.Recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи лент',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique timeline recipe'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.16 on 2026-10-18 17:58
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_counted_until(apps, schema_editor):
+    # Всё, что добавлено до прошлого пересчёта, уже учтено.
+    RatingState = apps.get_model("foodgram", "RatingState")
+    RatingState.objects.update(counted_until=F("refreshed_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0009_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ratingstate',
+            name='counted_until',
+            field=models.DateTimeField(null=True, verbose_name='Учтено до'),
+        ),
+        migrations.RunPython(fill_counted_until, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='ratingstate',
+            name='last_cart_id',
+        ),
+        migrations.RemoveField(
+            model_name='ratingstate',
+            name='last_favorite_id',
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['created'], name='favorite_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['created'], name='cart_created_idx'),
+        ),
+    ]
@@ -75,6 +75,68 @@ class Ingredients(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet рецептов."""
+
+    def with_user_flags(self, user):
+        """Флаги избранного, корзины и подписки для пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_subscribed=models.Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef("pk"))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef("pk"))),
+            is_subscribed=models.Exists(Subscribe.objects.filter(
+                user=user, author=models.OuterRef("author"))),
+        )
+
+    def with_ingredient_match(self, ingredient_ids):
+        """
+        Рецепты хотя бы с одним из ингредиентов: matched - сколько их
+        есть, missing - сколько не хватает. Сначала рецепты, для
+        которых есть всё, затем без одного ингредиента и т. д.
+        """
+        return self.filter(
+            ingredientamount__ingredient_id__in=ingredient_ids
+        ).annotate(
+            matched=models.Count("ingredientamount"),
+        ).annotate(
+            missing=models.F("ingredients_count") - models.F("matched"),
+        ).order_by("missing", "-matched", "-id")
+
+    def with_related(self):
+        """Всё, что нужно для полного представления рецепта."""
+        return self.select_related("author").prefetch_related(
+            *recipe_prefetch_lookups())
+
+    def first_per_author(self, limit):
+        """Не больше limit последних рецептов каждого автора."""
+        return self.filter(id__in=models.Subquery(
+            self.model.objects.filter(
+                author=models.OuterRef("author")
+            ).values("id")[:limit]
+        ))
+
+
+def recipe_prefetch_lookups():
+    """Связанные объекты, которые выводятся вместе с рецептом."""
+    return (
+        "tags",
+        models.Prefetch(
+            "ingredientamount_set",
+            queryset=IngredientAmount.objects.select_related("ingredient"),
+        ),
+    )
+
+
 class Recipe(models.Model):
     """Основная модель, рецепт."""
 
@@ -90,6 +152,19 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to="backend/",
         verbose_name="Картинка")
+    # Заполняются фоновой обработкой, см. foodgram.images.
+    image_thumbnail = models.ImageField(
+        upload_to="backend/thumbnails/",
+        verbose_name="Картинка для карточки",
+        blank=True,
+        editable=False,
+    )
+    image_webp = models.ImageField(
+        upload_to="backend/webp/",
+        verbose_name="Картинка WebP",
+        blank=True,
+        editable=False,
+    )
     text = models.CharField(
         verbose_name="Текствое описание",
         max_length=300)
@@ -109,15 +184,57 @@ class Recipe(models.Model):
                 1, message="Минимальное время - 1 минута!"),
         ),
     )
+    # Название, описание и ингредиенты для поиска, см. foodgram.search.
+    search_document = models.TextField(
+        verbose_name="Поисковый документ",
+        blank=True,
+        default="",
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        editable=False,
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name="В корзине",
+        default=0,
+        editable=False,
+    )
+    ingredients_count = models.PositiveIntegerField(
+        verbose_name="Ингредиентов",
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    # Счётчики меняются только F()-выражениями, см. foodgram.signals.
+    COUNTER_FIELDS = ("favorites_count", "cart_count", "ingredients_count")
 
     class Meta:
         ordering = ("-id",)
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            # Рецепты автора в порядке ленты: author=... ORDER BY -id.
+            models.Index(
+                fields=["author", "-id"], name="recipe_author_id_desc_idx"),
+        ]
 
     def __str__(self):
         return self.text[:20]
 
+    def save(self, *args, **kwargs):
+        """Сохранение без перезаписи счётчиков устаревшими значениями."""
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientAmount(models.Model):
     """
@@ -142,11 +259,19 @@ class IngredientAmount(models.Model):
         verbose_name = "Количество ингридиента"
         verbose_name_plural = "Количество ингридиентов"
         constraints = [
+            # recipe первым: по нему выбираются ингредиенты рецепта.
             models.UniqueConstraint(
-                fields=["ingredient", "recipe"],
-                name="unique ingredients recipe"
+                fields=["recipe", "ingredient"],
+                name="unique recipe ingredients"
             )
         ]
+        indexes = [
+            # Обратный индекс ингредиент -> рецепты для подбора рецептов
+            # по продуктам: читается без обращения к таблице.
+            models.Index(
+                fields=["ingredient", "recipe"],
+                name="ingredient_recipe_idx"),
+        ]
 
 
 class Subscribe(models.Model):
@@ -194,6 +319,10 @@ class ShoppingCart(models.Model):
         related_name="cart",
         verbose_name="Рецепт",
     )
+    created = models.DateTimeField(
+        verbose_name="Добавлен",
+        auto_now_add=True,
+    )
 
     class Meta:
         ordering = ("-id",)
@@ -203,6 +332,9 @@ class ShoppingCart(models.Model):
                 fields=["user", "recipe"],
                 name="unique cart user")
         ]
+        indexes = [
+            models.Index(fields=["created"], name="cart_created_idx"),
+        ]
 
 
 class Favorite(models.Model):
@@ -219,8 +351,140 @@ class Favorite(models.Model):
         related_name="favorites",
         verbose_name="Рецепт",
     )
+    created = models.DateTimeField(
+        verbose_name="Добавлен",
+        auto_now_add=True,
+    )
 
     class Meta:
         ordering = ("-id",)
         verbose_name = "Избранное"
         verbose_name_plural = "Избранные"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique favorite user")
+        ]
+        indexes = [
+            models.Index(fields=["created"], name="favorite_created_idx"),
+        ]
+
+
+class AuthorCounter(models.Model):
+    """Счётчики автора."""
+
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="counter",
+        verbose_name="Автор",
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Счётчики автора"
+        verbose_name_plural = "Счётчики авторов"
+
+    def __str__(self) -> str:
+        return f"{self.author}: {self.recipes_count}."
+
+
+class TimelineEntry(models.Model):
+    """
+    Рецепт в ленте подписчика: лента заполняется при публикации
+    рецепта, а не собирается при каждом чтении, см. foodgram.timeline.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Рецепт",
+    )
+    # Копия recipe.author: отписка удаляет записи без JOIN.
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique timeline recipe")
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "author"], name="timeline_user_author_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user}: {self.recipe_id}."
+
+
+class RecipeRating(models.Model):
+    """
+    Рейтинги рецепта для ?ordering=popular|trending, пересчитываются
+    командой refresh_rankings, см. foodgram.rankings.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rating",
+        verbose_name="Рецепт",
+    )
+    popular_score = models.FloatField(
+        verbose_name="Популярность",
+        default=0,
+    )
+    trending_score = models.FloatField(
+        verbose_name="Популярность сейчас",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Рейтинг рецепта"
+        verbose_name_plural = "Рейтинги рецептов"
+        indexes = [
+            models.Index(
+                fields=["-popular_score"], name="rating_popular_idx"),
+            models.Index(
+                fields=["-trending_score"], name="rating_trending_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.recipe_id}: {self.popular_score:.2f}."
+
+
+class RatingState(models.Model):
+    """Докуда обработаны добавления в избранное и корзину."""
+
+    epoch = models.DateTimeField(verbose_name="Точка отсчёта")
+    # Добавления с created раньше этой отметки учтены; пусто - ничего.
+    counted_until = models.DateTimeField(
+        null=True, verbose_name="Учтено до")
+    refreshed_at = models.DateTimeField(verbose_name="Пересчитано")
+
+    class Meta:
+        verbose_name = "Состояние рейтингов"
+        verbose_name_plural = "Состояние рейтингов"
@@ -0,0 +1,108 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Favorite, RatingState, RecipeRating, ShoppingCart
+
+# Вклад одного добавления: избранное весит больше корзины.
+WEIGHTS = {
+    Favorite: 2.0,
+    ShoppingCart: 1.0,
+}
+# created ставится до вставки, а строка видна только после коммита:
+# добавления моложе COMMIT_LAG откладываются до следующего пересчёта,
+# чтобы не пропустить транзакции, которые ещё не закоммичены.
+COMMIT_LAG = timedelta(minutes=5)
+# Вклад добавления уменьшается вдвое за период полураспада, секунды.
+POPULAR_HALF_LIFE = 30 * 24 * 60 * 60
+TRENDING_HALF_LIFE = 24 * 60 * 60
+# Через столько периодов trending точка отсчёта сдвигается к текущему
+# времени, иначе 2 ** x выйдет за пределы float.
+REBASE_AFTER = 512
+BATCH_SIZE = 1000
+
+
+def forward_decay(weight, seconds, half_life):
+    """
+    Вклад события через seconds после точки отсчёта. Затухание на
+    текущий момент - общий для всех рецептов множитель, поэтому
+    порядок по хранимым суммам тот же, что по затухшим, и при
+    пересчёте достаточно прибавить вклад новых событий.
+    """
+    return weight * 2 ** (seconds / half_life)
+
+
+def rebase(state, now):
+    """Перенос точки отсчёта на now: все рейтинги умножаются на 2 ** -x."""
+    seconds = (now - state.epoch).total_seconds()
+    RecipeRating.objects.update(
+        popular_score=F("popular_score") * 2 ** (
+            -seconds / POPULAR_HALF_LIFE),
+        trending_score=F("trending_score") * 2 ** (
+            -seconds / TRENDING_HALF_LIFE),
+    )
+    state.epoch = now
+
+
+def apply_scores(scores):
+    """Прибавление вкладов к рейтингам рецептов пачками."""
+    ratings = RecipeRating.objects.in_bulk(list(scores))
+    created = []
+    for recipe_id, (popular, trending) in scores.items():
+        rating = ratings.get(recipe_id)
+        if rating is None:
+            created.append(RecipeRating(
+                recipe_id=recipe_id,
+                popular_score=popular,
+                trending_score=trending,
+            ))
+            continue
+        rating.popular_score += popular
+        rating.trending_score += trending
+    RecipeRating.objects.bulk_update(
+        ratings.values(), ("popular_score", "trending_score"), BATCH_SIZE)
+    RecipeRating.objects.bulk_create(created, BATCH_SIZE)
+
+
+@transaction.atomic
+def refresh_rankings(full=False):
+    """
+    Учёт добавлений в избранное и корзину с прошлого пересчёта:
+    created от counted_until до now - COMMIT_LAG. Окна соседних
+    пересчётов не пересекаются, поэтому каждое добавление учитывается
+    один раз. full - пересчитать всё заново: так уходят и удалённые
+    добавления. Возвращает число обновлённых рецептов и учтённых событий.
+    """
+    now = timezone.now()
+    RatingState.objects.get_or_create(
+        pk=1, defaults={"epoch": now, "refreshed_at": now})
+    state = RatingState.objects.select_for_update().get(pk=1)
+    if full:
+        RecipeRating.objects.all().delete()
+        state.epoch = now
+        state.counted_until = None
+    elif ((now - state.epoch).total_seconds() / TRENDING_HALF_LIFE
+          > REBASE_AFTER):
+        rebase(state, now)
+    counted_until = now - COMMIT_LAG
+    scores = defaultdict(lambda: [0.0, 0.0])
+    events = 0
+    for model, weight in WEIGHTS.items():
+        rows = model.objects.filter(created__lt=counted_until)
+        if state.counted_until is not None:
+            rows = rows.filter(created__gte=state.counted_until)
+        for recipe_id, created in rows.values_list(
+                "recipe_id", "created").iterator():
+            seconds = (created - state.epoch).total_seconds()
+            score = scores[recipe_id]
+            score[0] += forward_decay(weight, seconds, POPULAR_HALF_LIFE)
+            score[1] += forward_decay(weight, seconds, TRENDING_HALF_LIFE)
+            events += 1
+    apply_scores(scores)
+    state.counted_until = counted_until
+    state.refreshed_at = now
+    state.save()
+    return len(scores), events
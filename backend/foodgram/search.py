@@ -0,0 +1,158 @@
+import re
+
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import IngredientAmount, Recipe
+
+# Postgres: GIN-индекс по выражению, запрос должен повторять его дословно.
+# Совпадение в названии весит больше, чем в остальном документе.
+SEARCH_CONFIG = "russian"
+TSVECTOR = (
+    f"(setweight(to_tsvector('{SEARCH_CONFIG}', "
+    "\"foodgram_recipe\".\"name\"), 'A') || "
+    f"to_tsvector('{SEARCH_CONFIG}', "
+    "\"foodgram_recipe\".\"search_document\"))"
+)
+PG_INDEX_NAME = "foodgram_recipe_search_gin"
+# SQLite: таблица FTS5 с внешним содержимым, синхронизируется триггерами.
+FTS_TABLE = "foodgram_recipe_search"
+FTS_RANK = f"bm25({FTS_TABLE}, 10.0, 1.0)"
+FTS_TRIGGERS = {
+    f"{FTS_TABLE}_insert": (
+        "AFTER INSERT ON foodgram_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, search_document) "
+        "VALUES (new.id, new.name, new.search_document); END"
+    ),
+    f"{FTS_TABLE}_delete": (
+        "AFTER DELETE ON foodgram_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, search_document) "
+        "VALUES ('delete', old.id, old.name, old.search_document); END"
+    ),
+    f"{FTS_TABLE}_update": (
+        "AFTER UPDATE OF name, search_document ON foodgram_recipe BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, search_document) "
+        "VALUES ('delete', old.id, old.name, old.search_document); "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, search_document) "
+        "VALUES (new.id, new.name, new.search_document); END"
+    ),
+}
+
+
+def build_search_document(name, text, ingredient_names):
+    return "\n".join((name, text, *ingredient_names))
+
+
+def update_search_documents(recipe_ids):
+    """Пересборка поискового документа: название, описание, ингредиенты."""
+    ingredient_names = defaultdict(list)
+    for recipe_id, name in IngredientAmount.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list("recipe_id", "ingredient__name").order_by(
+        "ingredient__name"
+    ):
+        ingredient_names[recipe_id].append(name)
+    for recipe_id, name, text in Recipe.objects.filter(
+            id__in=recipe_ids).values_list("id", "name", "text"):
+        Recipe.objects.filter(id=recipe_id).update(
+            search_document=build_search_document(
+                name, text, ingredient_names[recipe_id]))
+
+
+def install_search_index(connection):
+    """
+    Индекс полнотекстового поиска для текущей базы. Повторный вызов
+    безопасен; на SQLite заново создаёт триггеры, если их удалила
+    пересборка таблицы foodgram_recipe в миграциях.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} "
+                f"ON foodgram_recipe USING gin ({TSVECTOR})")
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'foodgram_recipe'")
+            if set(FTS_TRIGGERS) <= {row[0] for row in cursor.fetchall()}:
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "name, search_document, content='foodgram_recipe', "
+                "content_rowid='id')")
+            for name, trigger in FTS_TRIGGERS.items():
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"CREATE TRIGGER {name} {trigger}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"DROP INDEX IF EXISTS {PG_INDEX_NAME}")
+        elif connection.vendor == "sqlite":
+            for name in FTS_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def has_fts_table(connection):
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def query_words(query):
+    """Только буквы и цифры: операторы поисковых языков не нужны."""
+    return re.findall(r"\w+", query)
+
+
+def tsquery_text(words):
+    """Все слова запроса как префиксы, для to_tsquery."""
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def fts_query(words):
+    """Все слова запроса как префиксы, для MATCH в FTS5."""
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, query):
+    """
+    Рецепты, подходящие под запрос, с оценкой search_rank, лучшие
+    сверху. Postgres - tsvector и GIN-индекс, SQLite - FTS5, иначе
+    icontains по поисковому документу.
+    """
+    words = query_words(query)
+    if not words:
+        return queryset.none()
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        tsquery = f"to_tsquery('{SEARCH_CONFIG}', %s)"
+        text = tsquery_text(words)
+        queryset = queryset.extra(
+            where=[f"{TSVECTOR} @@ {tsquery}"], params=[text]
+        ).annotate(search_rank=RawSQL(
+            f"ts_rank({TSVECTOR}, {tsquery})", (text,),
+            output_field=FloatField()))
+    elif connection.vendor == "sqlite" and has_fts_table(connection):
+        match = fts_query(words)
+        queryset = queryset.extra(
+            where=[
+                f'"foodgram_recipe"."id" IN (SELECT rowid FROM {FTS_TABLE} '
+                f"WHERE {FTS_TABLE} MATCH %s)"
+            ],
+            params=[match],
+        ).annotate(search_rank=RawSQL(
+            # bm25 в FTS5 тем меньше, чем лучше совпадение.
+            f"(SELECT -{FTS_RANK} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f'AND rowid = "foodgram_recipe"."id")', (match,),
+            output_field=FloatField()))
+    else:
+        for word in words:
+            queryset = queryset.filter(search_document__icontains=word)
+        queryset = queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by("-search_rank", "-id")
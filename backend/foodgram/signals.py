@@ -0,0 +1,119 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import timeline
+from .images import schedule_image_processing
+from .models import (
+    AuthorCounter, Favorite, IngredientAmount, Ingredients, Recipe,
+    ShoppingCart, Subscribe, User,
+)
+from .search import update_search_documents
+
+# Справочник изменён в обход save()/delete(), например bulk_create.
+catalog_loaded = Signal()
+
+# Счётчик рецепта для каждой модели-связки с ним.
+RECIPE_COUNTERS = {
+    Favorite: "favorites_count",
+    ShoppingCart: "cart_count",
+    IngredientAmount: "ingredients_count",
+}
+
+
+def change_recipe_counter(model, recipe_ids, delta):
+    """Атомарное изменение счётчика рецептов на delta."""
+    field = RECIPE_COUNTERS[model]
+    recipes = Recipe.objects.filter(id__in=recipe_ids)
+    if delta < 0:
+        recipes = recipes.filter(**{f"{field}__gte": -delta})
+    recipes.update(**{field: F(field) + delta})
+
+
+def change_author_counter(author_id, field, delta):
+    """Атомарное изменение счётчика автора на delta."""
+    counters = AuthorCounter.objects.filter(author_id=author_id)
+    if delta < 0:
+        counters = counters.filter(**{f"{field}__gte": -delta})
+    if counters.update(**{field: F(field) + delta}) or delta < 0:
+        return
+    _, created = AuthorCounter.objects.get_or_create(
+        author_id=author_id, defaults={field: delta})
+    if not created:
+        counters.update(**{field: F(field) + delta})
+
+
+# Строки избранного, корзины и ингредиентов пишутся и удаляются
+# пачками, счётчики меняют сами эти пачки: без обработчиков по строкам
+# удаление, в том числе каскадом, - один DELETE.
+@receiver(pre_delete, sender=User)
+def decrement_user_recipe_counters(sender, instance, **kwargs):
+    """Избранное и корзина пользователя уходят каскадом."""
+    for model in (Favorite, ShoppingCart):
+        change_recipe_counter(
+            model,
+            model.objects.filter(user=instance).values("recipe_id"),
+            -1,
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_author_counter(instance.author_id, "recipes_count", 1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_author_counter(instance.author_id, "recipes_count", -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        change_author_counter(instance.author_id, "followers_count", 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def decrement_followers_count(sender, instance, **kwargs):
+    change_author_counter(instance.author_id, "followers_count", -1)
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_recipe_image(sender, instance, **kwargs):
+    """Новая картинка ещё без вариантов уходит в фоновую обработку."""
+    if instance.image and not instance.image_thumbnail:
+        schedule_image_processing(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_document(sender, instance, **kwargs):
+    update_search_documents((instance.id,))
+
+
+@receiver(pre_delete, sender=Ingredients)
+def remember_ingredient_recipes(sender, instance, **kwargs):
+    instance.recipe_ids = list(IngredientAmount.objects.filter(
+        ingredient=instance).values_list("recipe_id", flat=True))
+
+
+@receiver(post_delete, sender=Ingredients)
+def update_ingredient_recipes(sender, instance, **kwargs):
+    """Удалённый ингредиент уходит из счётчиков и документов рецептов."""
+    recipe_ids = getattr(instance, "recipe_ids", ())
+    if recipe_ids:
+        change_recipe_counter(IngredientAmount, recipe_ids, -1)
+        update_search_documents(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredients)
+def update_ingredient_recipes_search_document(sender, instance, created,
+                                              **kwargs):
+    """Переименованный ингредиент - в документах его рецептов."""
+    if not created:
+        update_search_documents(
+            IngredientAmount.objects.filter(
+                ingredient=instance).values_list("recipe_id", flat=True))
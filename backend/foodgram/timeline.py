@@ -0,0 +1,140 @@
+import heapq
+
+from django.db.models import Count
+
+from .models import AuthorCounter, Recipe, Subscribe, TimelineEntry
+
+# Сколько последних рецептов хранится в ленте пользователя.
+TIMELINE_MAX_ENTRIES = 500
+# Рецепты авторов с большим числом подписчиков в ленты не копируются,
+# а подмешиваются при чтении.
+FANOUT_MAX_FOLLOWERS = 5000
+
+
+def is_heavy_author(author_id):
+    return AuthorCounter.objects.filter(
+        author_id=author_id,
+        followers_count__gt=FANOUT_MAX_FOLLOWERS,
+    ).exists()
+
+
+def fan_out(recipe):
+    """Новый рецепт - в ленты всех подписчиков автора."""
+    if is_heavy_author(recipe.author_id):
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe.id,
+                author_id=recipe.author_id,
+            )
+            for user_id in Subscribe.objects.filter(
+                author_id=recipe.author_id).values_list("user_id", flat=True)
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Последние рецепты автора - в ленту нового подписчика."""
+    if is_heavy_author(author_id):
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+            for recipe_id in Recipe.objects.filter(
+                author_id=author_id
+            ).order_by("-id").values_list(
+                "id", flat=True
+            )[:TIMELINE_MAX_ENTRIES]
+        ),
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def prune(user_id, author_id):
+    """Отписка: рецепты автора уходят из ленты."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def trim(user_id):
+    """Из ленты удаляется всё старше TIMELINE_MAX_ENTRIES записей."""
+    boundary = TimelineEntry.objects.filter(
+        user_id=user_id
+    ).order_by("-recipe_id").values_list(
+        "recipe_id", flat=True
+    )[TIMELINE_MAX_ENTRIES:TIMELINE_MAX_ENTRIES + 1].first()
+    if boundary is not None:
+        TimelineEntry.objects.filter(
+            user_id=user_id, recipe_id__lte=boundary).delete()
+
+
+def trim_all():
+    """
+    Обрезка всех лент длиннее TIMELINE_MAX_ENTRIES: fan_out только
+    добавляет записи, а чтение ленты ничего не удаляет. Возвращает
+    число обрезанных лент.
+    """
+    user_ids = TimelineEntry.objects.values("user_id").annotate(
+        entries=Count("id"),
+    ).filter(
+        entries__gt=TIMELINE_MAX_ENTRIES,
+    ).values_list("user_id", flat=True)
+    user_ids = list(user_ids)
+    for user_id in user_ids:
+        trim(user_id)
+    return len(user_ids)
+
+
+class Feed:
+    """
+    Лента пользователя как последовательность для Paginator. Страница
+    собирается слиянием двух источников, новые сверху: его таблицы
+    ленты по (user, -recipe_id) и последних рецептов каждого автора
+    с большим числом подписчиков по (author, -id). Из recipes, то есть
+    queryset.values() с полем id, загружаются только рецепты страницы.
+    """
+
+    def __init__(self, user, recipes):
+        self.user = user
+        self.recipes = recipes
+        self.heavy_authors = dict(Subscribe.objects.filter(
+            user=user,
+            author__counter__followers_count__gt=FANOUT_MAX_FOLLOWERS,
+        ).values_list("author_id", "author__counter__recipes_count"))
+
+    def count(self):
+        # Рецепт тяжёлого автора, попавший в ленту до того, как автор
+        # стал тяжёлым, считается дважды: последняя страница бывает
+        # короче.
+        return TimelineEntry.objects.filter(
+            user=self.user).count() + sum(self.heavy_authors.values())
+
+    def recipe_ids(self, stop):
+        """Первые stop id ленты, без повторов."""
+        sources = [
+            TimelineEntry.objects.filter(user=self.user).order_by(
+                "-recipe_id").values_list("recipe_id", flat=True)[:stop],
+        ]
+        sources.extend(
+            Recipe.objects.filter(author_id=author_id).order_by(
+                "-id").values_list("id", flat=True)[:stop]
+            for author_id in self.heavy_authors
+        )
+        recipe_ids = []
+        for recipe_id in heapq.merge(*sources, reverse=True):
+            if not recipe_ids or recipe_ids[-1] != recipe_id:
+                recipe_ids.append(recipe_id)
+        return recipe_ids[:stop]
+
+    def __getitem__(self, page):
+        recipe_ids = self.recipe_ids(page.stop)[page]
+        position = {
+            recipe_id: index for index, recipe_id in enumerate(recipe_ids)}
+        return sorted(
+            self.recipes.filter(id__in=recipe_ids),
+            key=lambda row: position[row["id"]],
+        )
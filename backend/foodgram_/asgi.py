@@ -0,0 +1,18 @@
+"""
+ASGI config for foodgram_ project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Read-only endpoints get async views here, see ``api.async_views``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+application = get_asgi_application()
@@ -9,7 +9,7 @@ SECRET_KEY = os.getenv(
     "TOKEN",
     default="a@(tsb$&1oyxaok&+nq!#55g0zk63*!cb1ix+rrt6%orgyaqi^")
 
-DEBUG = True
+DEBUG = os.getenv("DEBUG", default="False") == "True"
 
 ALLOWED_HOSTS = ["foodwithmunkushi.ddns.net", "51.250.26.158", "localhost", "backend"]
 
@@ -27,8 +27,8 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'djoser',
     'django_filters',
-    "foodgram",
-    "api",
+    "foodgram.apps.FoodgramConfig",
+    "api.apps.ApiConfig",
     'corsheaders'
 ]
 
@@ -41,8 +41,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    "api.middleware.QueryMetricsMiddleware",
 ]
 
+# Замеры запросов к API, см. api.middleware; отчёт - GET /api/metrics/.
+API_METRICS = os.getenv("API_METRICS", default="False") == "True"
+# Сколько последних запросов хранить на маршрут.
+API_METRICS_SAMPLES = 1000
+# Столько одинаковых запросов за один ответ - признак N+1.
+API_METRICS_REPEAT_THRESHOLD = 5
+
 ROOT_URLCONF = 'foodgram_.urls'
 
 TEMPLATES = [
@@ -63,6 +71,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram_.wsgi.application'
 
+# Первичные ключи как в существующих миграциях.
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -104,8 +115,6 @@ TIME_ZONE = 'UTC'
 
 USE_I18N = True
 
-USE_L10N = True
-
 USE_TZ = True
 
 STATIC_URL = "/static/"
@@ -113,8 +122,34 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Кеш общий для всех воркеров: версии кеша и закешированные ответы
+# должны совпадать во всех процессах. Без REDIS_URL - кеш процесса,
+# только для разработки и тестов.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Потоки фоновой обработки картинок; 0 - только команда process_images.
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", default=2))
+
+# Async-обработчики справочников, списка рецептов и выгрузки списка
+# покупок; включаются в foodgram_.asgi. Синхронные view под ASGI
+# выполняются в пуле из ASYNC_VIEW_WORKERS потоков.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", default="False") == "True"
+ASYNC_VIEW_WORKERS = int(os.getenv("ASYNC_VIEW_WORKERS", default=8))
 
-CORS_ORIGIN_ALLOW_ALL = True
+CORS_ALLOW_ALL_ORIGINS = True
 CORS_URLS_REGEX = r"^/api/.*$"
 
 REST_FRAMEWORK = {